@@ -8,15 +8,14 @@ from maa.context import Context
 from . import arena_helper
 import logging
 import json
-
-stats = arena_helper.arena_stats # 简写
+from utils import common_func
 
 @AgentServer.custom_action("reset_arena_data")
 class ResetArenaData(CustomAction):
     """重置竞技场数据"""
     def run(self,context:Context,argv:CustomAction.RunArg) -> bool:
         logging.info(f"[重置竞技场数据] 重置竞技场已战斗数据")
-        arena_helper.arena_stats.reset_arena()
+        arena_helper.get_arena_stats().reset_arena()
         return True
 
 @AgentServer.custom_action("load_arena_data")
@@ -24,6 +23,7 @@ class LoadArenaData(CustomAction):
     """读取竞技场设置"""
     def run(self,context:Context,argv:CustomAction.RunArg) -> bool:
         try:
+            stats = arena_helper.get_arena_stats() # 简写
             # 读取参数
             params = json.loads(argv.custom_action_param)
             target_points = int(params.get("target_points",0))
@@ -41,6 +41,7 @@ class StoreCurrentArenaPoints(CustomAction):
     """储存 OCR 识别到的当前积分"""
     def run(self,context:Context,argv:CustomAction.RunArg) -> bool:
         try:
+            stats = arena_helper.get_arena_stats() # 简写
             # 获取 OCR 结果
             ocr_res = int(argv.reco_detail.best_result.text)
             logging.info(f"[记录竞技场积分] OCR 识别结果为 {ocr_res}")
@@ -59,14 +60,15 @@ class StoreArenaResult(CustomAction):
     """根据当前战斗结果是胜利还是失败，将相关统计数据加一"""
     def run(self,context:Context,argv:CustomAction.RunArg) -> bool:
         try:
+            stats = arena_helper.get_arena_stats() # 简写
             node_name = argv.node_name # 取当前节点名。
 
             if "胜利" in node_name:
-                stats.win_count += 1
-                logging.info(f"竞技场获胜，当前胜利场数{stats.win_count}")
+                win_count = stats.incr("win_count")
+                logging.info(f"竞技场获胜，当前胜利场数{win_count}")
             elif "失败" in node_name:
-                stats.loss_count += 1
-                logging.info(f"竞技场失败，当前失败场数{stats.loss_count}")
+                loss_count = stats.incr("loss_count")
+                logging.info(f"竞技场失败，当前失败场数{loss_count}")
             else:
                 raise ValueError((f"致命错误：在名称 '{node_name}' 中未识别战斗结果(胜利/失败)！请确保你在正确的节点调用此动作，并且对节点规范命名。"))
             return True
@@ -79,9 +81,11 @@ class SetArenaResults(CustomAction):
     """在 GUI 界面展示竞技场相关结果"""
     def run(self,context:Context,argv:CustomAction.RunArg) -> bool:
         try:
+            stats = arena_helper.get_arena_stats()
             # 简写一下
-            win = stats.win_count
-            loss = stats.loss_count
+            counts = stats.snapshot("win_count", "loss_count")
+            win = counts["win_count"]
+            loss = counts["loss_count"]
 
             # 计算胜率
             if win+loss != 0:
@@ -97,7 +101,7 @@ class SetArenaResults(CustomAction):
             )
 
             # 使用 override_pipeline 修改当前节点的 focus 为完整字符串
-            context.override_pipeline({
+            common_func.apply_override(context, {
                 "输出竞技场数据统计":{
                     "focus":{
                         "Node.Action.Succeeded": message
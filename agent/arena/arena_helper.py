@@ -3,9 +3,11 @@
 # pos: 这里用来管理竞技场相关的数据。
 
 from dataclasses import dataclass,field
+from utils import session
+from utils.atomic import AtomicFields
 
 @dataclass
-class ArenaStats:
+class ArenaStats(AtomicFields):
     """竞技场相关的数据"""
     current_points: int = 0
     target_points: int = 100
@@ -14,9 +16,12 @@ class ArenaStats:
 
     def reset_arena(self):
         """将所有竞技场相关数据重置为默认值。"""
-        self.current_points = 0
-        self.target_points = 100
-        self.win_count = 0
-        self.loss_count = 0
+        with self.locked():
+            self.current_points = 0
+            self.target_points = 100
+            self.win_count = 0
+            self.loss_count = 0
 
-arena_stats = ArenaStats()
\ No newline at end of file
+def get_arena_stats() -> ArenaStats:
+    """当前 tasker 的竞技场数据，每个游戏窗口各有一份"""
+    return session.current().get("arena", ArenaStats)
\ No newline at end of file
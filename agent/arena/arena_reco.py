@@ -8,13 +8,12 @@ from maa.context import Context
 from . import arena_helper
 import logging
 
-stats = arena_helper.arena_stats # 简写
-
 @AgentServer.custom_recognition("should_continue_arena")
 class ShouldContinueArena(CustomRecognition):
     def analyze(self, context: Context, argv: CustomRecognition.AnalyzeArg) -> CustomRecognition.AnalyzeResult:
         """判断当前积分是否已达到目标积分，如果达到就停止竞技场。"""
         try:
+            stats = arena_helper.get_arena_stats() # 简写
             current_points = stats.current_points
             target_points = stats.target_points
             if current_points < target_points:
@@ -15,13 +15,18 @@ class SetEnemyNext(CustomAction):
     """根据当前敌人信息进行后续分流设置"""
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
         # 获取当前决策
-        info = battle_manager.active_context
+        info = battle_manager.get_active_context()
         action = battle_manager.get_battle_action(info.name,info.mode)
 
         # 根据是否放生重定向后续节点
         if action.is_release_op:
             common_func.dynamic_set_next(context, pre_node="放生分流", next_node="放生-放弃感染")
             msg = f"[{argv.node_name}] 已将放生分流重定向为放生分支"
+        elif battle_manager.should_force_release():
+            # 同一感染者已经打到重试上限，这一场再输就放生
+            info.forced_release = True
+            common_func.dynamic_set_next(context, pre_node="放生分流", next_node="放生-放弃感染")
+            msg = f"[{argv.node_name}] {info.name} 已战斗 {info.battle_count} 次，达到重试上限，失败后转入放生"
         else:
             common_func.dynamic_set_next(context, pre_node="放生分流", next_node="战斗失败处理")
             msg = f"[{argv.node_name}] 已将放生分流重定向为战斗失败"
@@ -34,13 +39,13 @@ class BattleWin(CustomAction):
     """战斗胜利时进行的相关处理,需要增加战斗次数、归档相关信息，并且输出反馈。"""
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
         # 增加战斗次数
-        battle_manager.active_context.battle_count += 1
+        battle_manager.get_active_context().incr("battle_count")
 
         # 进行战斗归档
         battle_manager.archive_battle_result("胜利")
 
         # 设置输出信息
-        current = battle_manager.active_context
+        current = battle_manager.get_active_context()
         if current.battle_count == 1:
             # 一次性获得胜利
             msg = f"[🗡️击败] {current.name} LV.{current.level} {current.mode} "
@@ -49,13 +54,22 @@ class BattleWin(CustomAction):
             msg = f"[⚔️击败] {current.name} LV.{current.level} {current.mode} | 击杀花费次数: {current.battle_count}"
 
         common_func.dynamic_set_focus(context,"输出战斗信息","RECO_OK",msg)
+        # 这只感染者已经结算，下一只即使名字、状态、等级相同也从头计数
+        current.end_encounter()
         return CustomAction.RunResult(success=True)
     
 @AgentServer.custom_action("battle_lose")
 class BattleLose(CustomAction):
-    """战斗失败时进行的相关处理,只需要增加战斗次数"""
+    """战斗失败时进行的相关处理,增加战斗次数，并检查重试上限"""
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
-        battle_manager.active_context.battle_count += 1
+        current = battle_manager.get_active_context()
+        current.incr("battle_count")
+
+        # 下一场是允许的最后一场时，把失败后的分流改为放生
+        # 只有第一次设置成功的线程负责改写分流
+        if battle_manager.should_force_release() and current.compare_and_set("forced_release", False, True):
+            common_func.dynamic_set_next(context, pre_node="放生分流", next_node="放生-放弃感染")
+            logging.info(f"[{argv.node_name}] {current.name} 已失败 {current.battle_count} 次，下一场失败后转入放生")
         return CustomAction.RunResult(success=True)
     
 @AgentServer.custom_action("battle_release")
@@ -63,38 +77,48 @@ class BattleRelease(CustomAction):
     """放生结束后的处理。"""
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
         # 虽然用不上，但还是增加战斗次数。
-        current = battle_manager.active_context
-        current.battle_count += 1
+        current = battle_manager.get_active_context()
+        current.incr("battle_count")
 
-        # 归档放生信息
-        battle_manager.archive_battle_result("放生")
+        # 归档放生信息，重试次数用完的强制放生单独记录
+        if current.forced_release:
+            battle_manager.archive_battle_result(battle_manager.RESULT_FORCED_RELEASE)
+        else:
+            battle_manager.archive_battle_result(battle_manager.RESULT_RELEASE)
 
         # 从档案中获取累计放生次数
-        profile = battle_manager.archives.get(current.name)
+        profile = battle_manager.get_archives().get(current.name)
         release_count = profile.get_record_by_mode(current.mode).release if profile else 1
 
-        # 整理用户需要看到的信息
-        focus_msg = f"[👋 放生] {current.name} LV.{current.level} {current.mode} | 累计放生: {release_count}"
-        common_func.dynamic_set_focus(context,"输出战斗信息","RECO_OK",focus_msg)
-
-        # 如果需要发送公屏信息,进行相关处理
-        if battle_manager.current_config.broadcast:
-            # 将后续节点导向公屏模块
-            common_func.dynamic_set_next(context,"放生广播分流","开始公屏发送")
-
-            # 整理公屏需要发送的信息
-            broadcast_msg = f"[感染者] {current.name} {current.mode} {battle_manager.current_config.broadcast_addition}"
-            context.override_pipeline({
-                "公屏输入文字":{
-                    "input_text":broadcast_msg
-                }
-            })
-
-            # 执行完公屏模块之后，回到战斗模块(测试期间会关闭点击发送消息的点击行为,防止发送错误消息 )
-            common_func.dynamic_set_next(context,"点击发送消息","放生结束")
-        else:
-            common_func.dynamic_set_next(context,"放生广播分流","放生结束")
-
+        # 本动作最多会改写四处 pipeline，合并成一次下发
+        with common_func.override_batch(context):
+            # 整理用户需要看到的信息
+            if current.forced_release:
+                focus_msg = f"[🏳️ 强制放生] {current.name} LV.{current.level} {current.mode} | 已战斗 {current.battle_count} 次 | 累计放生: {release_count}"
+            else:
+                focus_msg = f"[👋 放生] {current.name} LV.{current.level} {current.mode} | 累计放生: {release_count}"
+            common_func.dynamic_set_focus(context,"输出战斗信息","RECO_OK",focus_msg)
+
+            # 如果需要发送公屏信息,进行相关处理
+            if battle_manager.get_current_config().broadcast:
+                # 将后续节点导向公屏模块
+                common_func.dynamic_set_next(context,"放生广播分流","开始公屏发送")
+
+                # 整理公屏需要发送的信息
+                broadcast_msg = f"[感染者] {current.name} {current.mode} {battle_manager.get_current_config().broadcast_addition}"
+                common_func.apply_override(context, {
+                    "公屏输入文字":{
+                        "input_text":broadcast_msg
+                    }
+                })
+
+                # 执行完公屏模块之后，回到战斗模块(测试期间会关闭点击发送消息的点击行为,防止发送错误消息 )
+                common_func.dynamic_set_next(context,"点击发送消息","放生结束")
+            else:
+                common_func.dynamic_set_next(context,"放生广播分流","放生结束")
+
+        # 这只感染者已经结算，下一只即使名字、状态、等级相同也从头计数，不继承强制放生
+        current.end_encounter()
         return CustomAction.RunResult(success=True)
 
 
@@ -103,7 +127,7 @@ class SaveBattleConfig(CustomAction):
     """
     通用战斗配置保存动作。
     通过 custom_action_param 传入 config_key 和 config_value，
-    自动将配置项保存到 battle_manager.current_config 中。
+    自动将配置项保存到当前会话的 battle_manager 战斗配置中。
     """
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
         # 解析参数
@@ -137,6 +161,9 @@ class FinalizeBattleConfig(CustomAction):
         # 标记配置完成
         battle_manager.set_config_value("mark_configured", True)
 
+        # 把配置编译成决策表，跑图时直接查表
+        battle_manager.compile_decision_table()
+
         # 输出配置摘要
         summary = battle_manager.get_config_summary()
         logging.info(f"[{argv.node_name}] 战斗配置完成:\n{summary}")
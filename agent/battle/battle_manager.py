@@ -6,6 +6,12 @@
 # 1. 库与模块导入区 (Imports)
 # ==========================================
 from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Optional
+from utils import session
+from utils.atomic import AtomicFields
+from . import battle_store
+from . import deck_policy
 
 # ==========================================
 # 2. 常量与配置映射区 (Constants & Mappings)
@@ -24,6 +30,7 @@ GROUP_SIRIUS = "Sirius_Group"    # 天狼星大类
 
 RESULT_WIN = "胜利"
 RESULT_RELEASE = "放生"
+RESULT_FORCED_RELEASE = "强制放生"  # 重试次数用完后自动放生
 
 # --- 映射关系表 ---
 # 映射关系：具体小类 -> 大类
@@ -42,6 +49,18 @@ ENEMY_NAME_MAP = {
     # 没在字典里的默认归为 CAT_GENERAL
 }
 
+# 映射关系：配置项后缀 -> (小类, 状态)，放生开关与重试上限共用
+TARGET_SUFFIXES = {
+    "general_normal": (CAT_GENERAL, MODE_NORMAL),
+    "general_rampage": (CAT_GENERAL, MODE_RAMPAGE),
+    "blue_normal": (CAT_BLUE, MODE_NORMAL),
+    "blue_rampage": (CAT_BLUE, MODE_RAMPAGE),
+    "pink_normal": (CAT_PINK, MODE_NORMAL),
+    "pink_rampage": (CAT_PINK, MODE_RAMPAGE),
+    "red_normal": (CAT_RED, MODE_NORMAL),
+    "red_rampage": (CAT_RED, MODE_RAMPAGE),
+}
+
 # 战斗卡组 ROI
 # 分辨率缩放由框架解决,这里只负责 ROI 本身
 BATTLE_ROI = {
@@ -57,13 +76,25 @@ BATTLE_ROI = {
 # 定义数据的"形状"，这里只定义类，不创建具体的对象
 
 @dataclass
-class EncounterContext:
+class EncounterContext(AtomicFields):
     # 最近一次遭遇的感染者信息
     name: str = "未知感染者" # 名字
     mode: str = "普通" # 普通/暴走
     category: str = "一般" # 一般/狼
     level: int = 0 # 等级
     battle_count: int = 0 # 与同一个感染者已经战斗的次数
+    chosen_deck: str = "" # 自适应卡组为该感染者选定的卡组，同一感染者期间保持不变
+    forced_release: bool = False # 是否因重试次数用完而转入放生
+
+    def end_encounter(self):
+        """
+        一次遭遇结束(胜利或放生归档之后)，清空只属于这次遭遇的数据。
+        名字/状态/等级保留，下一只同样的感染者仍按原逻辑识别，但战斗次数从 0 重新计算。
+        """
+        with self.locked():
+            self.battle_count = 0
+            self.chosen_deck = ""
+            self.forced_release = False
 
 @dataclass
 class CombatRecord:    
@@ -72,6 +103,7 @@ class CombatRecord:
     win: int = 0
     loss: int = 0
     release:int = 0
+    forced_release: int = 0 # 其中因重试次数用完而强制放生的次数
 
 @dataclass
 class EnemyProfile:
@@ -121,6 +153,14 @@ class UserBattleConfig:
     broadcast = False
     broadcast_addition: str = ""
 
+    # --- 4. 重试上限 (category, mode) -> 与同一感染者最多战斗几次，0 或未设置为不限 ---
+    retry_budgets: dict[tuple[str, str], int] = field(default_factory=dict)
+
+    # --- 5. 自适应卡组 (可选) ---
+    adaptive_deck: bool = False
+    adaptive_explore_rate: float = 0.1
+    adaptive_min_samples: int = 5
+
     def set_release(self, category: str, mode: str, enable: bool):
         """
         供 UI 调用的辅助函数：切换某个选项的放生开关
@@ -133,27 +173,43 @@ class UserBattleConfig:
 
     
 
-@dataclass
+@dataclass(frozen=True)
 class BattleAction:
     deck_name: str         # 这次战斗用哪个名字的卡组
     is_release_op: bool    # 打完是否需要执行放生操作 (True/False)
+    click_roi: tuple = ()  # 卡组对应的点击区域，取自 BATTLE_ROI
 
 # ==========================================
-# 4. 全局状态实例化区 (Global Instances)
+# 4. 状态实例化区 (Session State)
 # ==========================================
 # 创建实际存储数据的容器，上面的类是图纸，这里是盖好的房子
+# 每个 tasker(游戏窗口)各有一份，通过 session 取出，多个窗口共用一个 agent 进程时互不干扰
 
-# 准备一个字典放所有敌人信息
-archives = {}
-
-# 当前正在战斗的上下文
-active_context = EncounterContext()
-
-# 实例化全局配置对象
-current_config = UserBattleConfig()
-
-# 配置是否已初始化的标志（必须通过战斗设置任务来设置）
-is_configured = False
+@dataclass
+class BattleState:
+    # 准备一个字典放所有敌人信息
+    archives: dict = field(default_factory=dict)
+    # 当前正在战斗的上下文
+    active_context: EncounterContext = field(default_factory=EncounterContext)
+    # 战斗配置
+    current_config: UserBattleConfig = field(default_factory=UserBattleConfig)
+    # 配置是否已初始化的标志（必须通过战斗设置任务来设置）
+    is_configured: bool = False
+    # 编译好的决策表：(小类, 状态) -> BattleAction，配置变化时置为 None 等待重建
+    decision_table: Optional[MappingProxyType] = None
+
+def get_state() -> BattleState:
+    """当前 tasker 的战斗状态"""
+    return session.current().get("battle", BattleState)
+
+def get_archives() -> dict:
+    return get_state().archives
+
+def get_active_context() -> EncounterContext:
+    return get_state().active_context
+
+def get_current_config() -> UserBattleConfig:
+    return get_state().current_config
 
 # ==========================================
 # 5. 核心逻辑函数区 (Core Logic Functions)
@@ -166,11 +222,11 @@ def determine_category(name_str):
     return ENEMY_NAME_MAP.get(name_str, CAT_GENERAL)
 
 def reset_enemy_data():
-    global active_context
+    state = get_state()
     # 清空历史记录字典
-    archives.clear()
+    state.archives.clear()
     # 重置当前敌人信息
-    active_context = EncounterContext()
+    state.active_context = EncounterContext()
     return True
 
 def update_encounter_context(name, mode, level):
@@ -178,63 +234,152 @@ def update_encounter_context(name, mode, level):
     遇到敌人后，先确认是否和上次是同一个敌人.
     如果不是同一个,录入当前敌人信息，并把本次战斗次数清空。
     """
+    active_context = get_active_context()
     # 判断是否和上次敌人名字、状态和等级都相同
     if name == active_context.name and mode == active_context.mode and level == active_context.level:
         return True
     else:
-        # 更新已知信息
-        active_context.name = name
-        active_context.mode = mode
-        active_context.level = level
-        # 根据名字判断种类
-        active_context.category = determine_category(name)
-        # 重置战斗次数
-        active_context.battle_count = 0
+        with active_context.locked():
+            # 更新已知信息
+            active_context.name = name
+            active_context.mode = mode
+            active_context.level = level
+            # 根据名字判断种类
+            active_context.category = determine_category(name)
+            # 重置战斗次数
+            active_context.end_encounter()
         return True
 
-def get_battle_action(name: str, mode: str) -> BattleAction:
+def resolve_battle_action(category: str, mode: str) -> BattleAction:
     """
-    输入：OCR识别的名字 ("超级天狼星"), 状态 ("暴走")
-    输出：战斗行动指令
+    根据小类和状态，按当前配置现算一份战斗行动指令。
+    正常运行时只在编译决策表时调用，其余时间直接查表。
     """
-    # 1. 第一步：查户口，确定具体分类
-    category = ENEMY_NAME_MAP.get(name, CAT_GENERAL)
-    
-    # 2. 第二步：判断是否触发放生 (最高优先级)
+    current_config = get_current_config()
+    # 1. 判断是否触发放生 (最高优先级)
     if (category, mode) in current_config.release_targets:
+        target_deck = current_config.deck_release
         return BattleAction(
-            deck_name=current_config.deck_release, 
-            is_release_op=True                     
+            deck_name=target_deck,
+            is_release_op=True,
+            click_roi=tuple(BATTLE_ROI[target_deck])
         )
-    
-    # 3. 第三步：如果没有放生，根据大类选择常规卡组
+
+    # 2. 如果没有放生，根据大类选择常规卡组
     group = CATEGORY_TO_GROUP.get(category, GROUP_GENERAL)
-    
+
     if group == GROUP_GENERAL:
         if mode == MODE_NORMAL:
             target_deck = current_config.deck_general_normal
         else:
             target_deck = current_config.deck_general_rampage
-            
+
     elif group == GROUP_SIRIUS:
         if mode == MODE_NORMAL:
             target_deck = current_config.deck_sirius_normal
         else:
             target_deck = current_config.deck_sirius_rampage
-            
+
     # 返回常规战斗指令
     return BattleAction(
         deck_name=target_deck,
-        is_release_op=False 
+        is_release_op=False,
+        click_roi=tuple(BATTLE_ROI[target_deck])
+    )
+
+def compile_decision_table():
+    """
+    把当前配置编译成只读决策表，所有 (小类, 状态) 组合的 BattleAction 都提前建好。
+    配置不变时 get_battle_action 只需一次字典查找，不再每次新建对象。
+    """
+    state = get_state()
+    table = {
+        (category, mode): resolve_battle_action(category, mode)
+        for category in CATEGORY_TO_GROUP
+        for mode in (MODE_NORMAL, MODE_RAMPAGE)
+    }
+    state.decision_table = MappingProxyType(table)
+    return state.decision_table
+
+def get_battle_action(name: str, mode: str) -> BattleAction:
+    """
+    输入：OCR识别的名字 ("超级天狼星"), 状态 ("暴走")
+    输出：战斗行动指令
+    """
+    # 查户口，确定具体分类
+    category = ENEMY_NAME_MAP.get(name, CAT_GENERAL)
+
+    state = get_state()
+    table = state.decision_table if state.decision_table is not None else compile_decision_table()
+    action = table.get((category, mode))
+    if action is None:
+        # 表里没有的状态(理论上不会出现)，按原规则现算
+        action = resolve_battle_action(category, mode)
+
+    # 自适应卡组只替换常规战斗的卡组，放生仍使用放生卡组
+    active_context = state.active_context
+    if state.current_config.adaptive_deck and not action.is_release_op \
+            and name == active_context.name and mode == active_context.mode:
+        action = get_adaptive_action(action)
+    return action
+
+def get_adaptive_action(configured: BattleAction) -> BattleAction:
+    """
+    按历史战绩为当前感染者选卡组。每个感染者只选一次，之后的识别直接复用，
+    保证同一个感染者的每一场都用同一套卡组，归档的卡组统计才有意义。
+    """
+    active_context = get_active_context()
+    current_config = get_current_config()
+    if not active_context.chosen_deck:
+        candidates = sorted({
+            current_config.deck_general_normal,
+            current_config.deck_general_rampage,
+            current_config.deck_sirius_normal,
+            current_config.deck_sirius_rampage,
+        })
+        deck, reason = deck_policy.choose_deck(
+            name=active_context.name,
+            mode=active_context.mode,
+            level=active_context.level,
+            configured_deck=configured.deck_name,
+            candidates=candidates,
+            explore_rate=current_config.adaptive_explore_rate,
+            min_samples=current_config.adaptive_min_samples,
+        )
+        active_context.chosen_deck = deck
+        deck_policy.log_choice(active_context.name, active_context.mode, active_context.level, deck, reason)
+
+    if active_context.chosen_deck == configured.deck_name:
+        return configured
+    return BattleAction(
+        deck_name=active_context.chosen_deck,
+        is_release_op=False,
+        click_roi=tuple(BATTLE_ROI[active_context.chosen_deck])
     )
 
+def should_force_release() -> bool:
+    """
+    判断当前感染者的重试次数是否已经用完。
+    在下一场开打之前调用：如果下一场就是允许的最后一场，输了就转入放生，不再继续重试。
+    """
+    active_context = get_active_context()
+    current_config = get_current_config()
+    budget = current_config.retry_budgets.get((active_context.category, active_context.mode), 0)
+    return budget > 0 and active_context.battle_count + 1 >= budget
+
 def archive_battle_result(result_type):
     """
-    通用归档函数：根据 result_type (胜利/放生) 来分别处理数据。
+    通用归档函数：根据 result_type (胜利/放生/强制放生) 来分别处理数据。
     """
+    state = get_state()
+    archives = state.archives
+    # 一次性取出活跃上下文，归档期间其他线程再改计数也不会读到一半
+    current = state.active_context.snapshot("name", "mode", "level", "battle_count")
     # 从活跃上下文里取名字
-    name = active_context.name
-    mode = active_context.mode
+    name = current["name"]
+    mode = current["mode"]
+    level = current["level"]
+    battle_count = current["battle_count"]
     
     # 懒加载：如果档案馆里没这个人，先建个档案
     if name not in archives:
@@ -251,19 +396,36 @@ def archive_battle_result(result_type):
         target_record.win += 1
         
         # 只有胜利时才结算之前的失败次数
-        if active_context.battle_count > 0:
-            target_record.loss += (active_context.battle_count - 1)
+        if battle_count > 0:
+            target_record.loss += (battle_count - 1)
         
     elif result_type == RESULT_RELEASE:
         # ------- 放生时的逻辑 -------
         target_record.release += 1
-        
+
+    elif result_type == RESULT_FORCED_RELEASE:
+        # ------- 重试次数用完的强制放生 -------
+        # 放生前打的每一场都输了，全部计入失败
+        target_record.release += 1
+        target_record.forced_release += 1
+        target_record.loss += battle_count
+
     else:
         raise ValueError(f"未知的归档类型: {result_type}")
     
     # 更新最大等级记录
-    if active_context.level > target_record.max_level:
-            target_record.max_level = active_context.level
+    if level > target_record.max_level:
+            target_record.max_level = level
+
+    # 写入持久化档案(只进缓冲，后台批量提交，不阻塞战斗循环)
+    battle_store.store.record(battle_store.BattleResultRow(
+        name=name,
+        mode=mode,
+        level=level,
+        result=result_type,
+        battles=battle_count,
+        deck=get_battle_action(name, mode).deck_name,
+    ))
 
     return True
 
@@ -283,7 +445,8 @@ def set_config_value(key: str, value) -> bool:
     Returns:
         bool: 设置是否成功
     """
-    global is_configured
+    state = get_state()
+    current_config = state.current_config
 
     # 卡组配置映射
     deck_keys = {
@@ -296,26 +459,41 @@ def set_config_value(key: str, value) -> bool:
 
     # 放生配置映射 (category, mode)
     release_keys = {
-        "release_general_normal": (CAT_GENERAL, MODE_NORMAL),
-        "release_general_rampage": (CAT_GENERAL, MODE_RAMPAGE),
-        "release_blue_normal": (CAT_BLUE, MODE_NORMAL),
-        "release_blue_rampage": (CAT_BLUE, MODE_RAMPAGE),
-        "release_pink_normal": (CAT_PINK, MODE_NORMAL),
-        "release_pink_rampage": (CAT_PINK, MODE_RAMPAGE),
-        "release_red_normal": (CAT_RED, MODE_NORMAL),
-        "release_red_rampage": (CAT_RED, MODE_RAMPAGE),
+        f"release_{suffix}": target for suffix, target in TARGET_SUFFIXES.items()
+    }
+
+    # 重试上限映射 (category, mode)
+    budget_keys = {
+        f"retry_budget_{suffix}": target for suffix, target in TARGET_SUFFIXES.items()
     }
 
     if key in deck_keys:
         # 设置卡组配置
-        setattr(current_config, deck_keys[key], value)
+        if getattr(current_config, deck_keys[key]) != value:
+            setattr(current_config, deck_keys[key], value)
+            state.decision_table = None
         return True
 
     elif key in release_keys:
         # 设置放生配置
         category, mode = release_keys[key]
         enable = str(value).lower() in ("true", "1", "yes")
-        current_config.set_release(category, mode, enable)
+        if ((category, mode) in current_config.release_targets) != enable:
+            current_config.set_release(category, mode, enable)
+            state.decision_table = None
+        return True
+
+    elif key in budget_keys:
+        # 设置单项重试上限
+        current_config.retry_budgets[budget_keys[key]] = max(int(value), 0)
+        return True
+
+    elif key == "retry_budgets":
+        # 一次设置多项重试上限，value 形如 {"general_normal": 3, "red_rampage": 1}
+        if not isinstance(value, dict):
+            raise ValueError(f"retry_budgets 需要字典，当前收到: {value}")
+        for suffix, budget in value.items():
+            set_config_value(f"retry_budget_{suffix}", budget)
         return True
 
     elif key == "broadcast":
@@ -331,13 +509,29 @@ def set_config_value(key: str, value) -> bool:
     elif key == "enable_release":
         # 放生总开关（如果关闭，清空所有放生目标）
         enable = str(value).lower() in ("true", "1", "yes")
-        if not enable:
+        if not enable and current_config.release_targets:
             current_config.release_targets.clear()
+            state.decision_table = None
+        return True
+
+    elif key == "adaptive_deck":
+        # 自适应卡组开关
+        current_config.adaptive_deck = str(value).lower() in ("true", "1", "yes")
+        return True
+
+    elif key == "adaptive_explore_rate":
+        # 自适应卡组的探索概率，限制在 0~1
+        current_config.adaptive_explore_rate = min(max(float(value), 0.0), 1.0)
+        return True
+
+    elif key == "adaptive_min_samples":
+        # 卡组参与比较所需的最少场数
+        current_config.adaptive_min_samples = max(int(value), 1)
         return True
 
     elif key == "mark_configured":
         # 标记配置完成
-        is_configured = True
+        state.is_configured = True
         return True
 
     else:
@@ -347,6 +541,16 @@ def get_config_summary() -> str:
     """
     获取当前配置的摘要信息，用于日志输出
     """
+    current_config = get_current_config()
+    budgets = {target: n for target, n in current_config.retry_budgets.items() if n > 0}
+    if budgets:
+        budget_desc = ", ".join(f"{category}{mode} {n} 次" for (category, mode), n in budgets.items())
+    else:
+        budget_desc = "不限"
+    if current_config.adaptive_deck:
+        adaptive_desc = f"开启(探索率 {current_config.adaptive_explore_rate:.0%})"
+    else:
+        adaptive_desc = "关闭"
     lines = [
         "=== 战斗配置摘要 ===",
         f"一般普通卡组: {current_config.deck_general_normal}",
@@ -356,6 +560,8 @@ def get_config_summary() -> str:
         f"放生卡组: {current_config.deck_release}",
         f"放生目标: {current_config.release_targets if current_config.release_targets else '无'}",
         f"公屏发送: {'开启' if current_config.broadcast else '关闭'}",
+        f"重试上限: {budget_desc}",
+        f"自适应卡组: {adaptive_desc}",
     ]
     if current_config.broadcast:
         lines.append(f"公屏附加信息: {current_config.broadcast_addition or '(空)'}")
@@ -366,4 +572,4 @@ def check_configured() -> bool:
     """
     检查战斗配置是否已完成初始化
     """
-    return is_configured
+    return get_state().is_configured
@@ -2,6 +2,8 @@ from maa.agent.agent_server import AgentServer
 from maa.custom_recognition import CustomRecognition
 from maa.context import Context
 from . import battle_manager
+from utils import frame_gate
+from utils import ocr_cache
 import logging
 import re
 
@@ -13,7 +15,8 @@ class ExtractEnemyInfo(CustomRecognition):
         context: Context,
         argv: CustomRecognition.AnalyzeArg,
     ) -> CustomRecognition.AnalyzeResult:
-        reco_detail = context.run_recognition("EnemyInfo",argv.image)
+        # 重试同一个感染者时横幅像素不变，直接用缓存的 OCR 结果
+        reco_detail = ocr_cache.run_recognition(context,"EnemyInfo",argv.image)
         if not reco_detail or not reco_detail.hit:
             logging.warning(f"[{argv.node_name}] 未识别到有效 OCR 结果")
             return None
@@ -21,10 +24,9 @@ class ExtractEnemyInfo(CustomRecognition):
         # 少数情况下，感染者名称与等级可能被识别为两个独立区块。
         # 因此不能直接获取 `best_result`，
         # 需提取所有识别结果并按横坐标顺序拼接，再进行后续处理
-        all_blocks = reco_detail.filtered_results
         try:
-            # 排序
-            all_blocks.sort(key=lambda block: block.box[0])
+            # 排序(结果可能来自缓存，排序到新列表，不改动原结果)
+            all_blocks = sorted(reco_detail.filtered_results, key=lambda block: block.box[0])
         except Exception as e:
             # 如果连坐标都读不出来，说明数据结构异常，报错
             logging.error(f"[{argv.node_name}] 排序 OCR 结果块时发生严重错误: {e}")
@@ -70,6 +72,9 @@ class ExtractEnemyInfo(CustomRecognition):
 @AgentServer.custom_recognition("enter_battle")
 class EnterBattle(CustomRecognition):
     """返回应该点击的卡组位置,进入战斗界面"""
+    # 放弃按钮没变化时直接复用"不在战斗页面"的结果；
+    # 命中时的卡组取决于当前敌人，不复用
+    @frame_gate.gated(rois=[[1158, 522, 122, 77]], cache_hits=False)
     def analyze(
         self,
         context: Context,
@@ -83,11 +88,11 @@ class EnterBattle(CustomRecognition):
             return CustomRecognition.AnalyzeResult(box=None, detail=msg)
 
         # 获取当前决策
-        info = battle_manager.active_context
+        info = battle_manager.get_active_context()
         action = battle_manager.get_battle_action(info.name,info.mode)
 
-        # 获取需要点击的 roi
-        click_roi = battle_manager.BATTLE_ROI[action.deck_name]
+        # 需要点击的 roi 在编译决策表时已经算好
+        click_roi = action.click_roi
 
         msg = f"[{argv.node_name}] 选择卡组为 {action.deck_name}, 点击坐标为 {click_roi}"
         return CustomRecognition.AnalyzeResult(box=click_roi, detail=msg)
\ No newline at end of file
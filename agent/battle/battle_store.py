@@ -0,0 +1,254 @@
+# input: battle_manager 归档的每一次战斗结果
+# output: 为 battle_manager 提供跨进程重启保留的战斗历史，以及胜率/平均重试次数查询
+# pos: 战斗档案的持久化层，SQLite(WAL) + 内存缓冲批量提交
+
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# 与 battle_manager 中的结果常量一致，这里不反向 import battle_manager
+RESULT_WIN = "胜利"
+RESULT_FORCED_RELEASE = "强制放生"
+
+# 数据库默认放在 agent 运行目录下的 data 文件夹
+DEFAULT_DB_PATH = os.path.join("data", "battle_archive.db")
+# 多个 agent 进程共用一个数据库时，写入冲突最多等待的秒数
+BUSY_TIMEOUT = 30.0
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS battle_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recorded_at REAL NOT NULL,
+        name TEXT NOT NULL,
+        mode TEXT NOT NULL,
+        level INTEGER NOT NULL,
+        result TEXT NOT NULL,
+        battles INTEGER NOT NULL,
+        deck TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_battle_results_enemy ON battle_results (name, mode, level)",
+)
+
+
+@dataclass
+class BattleResultRow:
+    # 一次归档：与某个敌人(名字/状态/等级)的最终结果
+    name: str
+    mode: str
+    level: int
+    result: str   # 胜利/放生/强制放生
+    battles: int  # 包括最终这一场在内，一共打了几场
+    deck: str     # 使用的卡组
+    recorded_at: float = 0.0
+
+
+@dataclass
+class EnemyHistory:
+    # 按条件汇总后的历史战绩
+    wins: int = 0
+    losses: int = 0
+    releases: int = 0
+    forced_releases: int = 0  # 其中因重试次数用完而强制放生的次数
+    retries: int = 0  # 胜利前累计失败的场数
+
+    @property
+    def win_rate(self) -> Optional[float]:
+        """单场胜率，没有数据时返回 None"""
+        total = self.wins + self.losses
+        return self.wins / total if total else None
+
+    @property
+    def avg_retries(self) -> Optional[float]:
+        """每次击杀平均需要重试的场数，没有胜利记录时返回 None"""
+        return self.retries / self.wins if self.wins else None
+
+
+class BattleStore:
+    """
+    战斗结果持久化。
+
+    record() 只把结果放进内存缓冲，立即返回，不会卡住战斗循环；
+    后台线程攒够 batch_size 条或每隔 flush_interval 秒统一写入一次。
+    查询前会先把缓冲写进数据库，保证查到的是最新数据。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, batch_size: int = 20, flush_interval: float = 5.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[BattleResultRow] = []
+        self._pending_lock = threading.Lock()
+        # 同一个连接在后台线程和查询线程之间共享，用锁串行化
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        # 数据库打不开时只记一次日志，之后只保留内存档案
+        self._disabled = False
+
+    # --- 连接与后台线程 ---
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 多个 agent 进程(见 supervisor)同时写入时由 SQLite 自身的文件锁串行化，
+            # 拿不到写锁时等待 BUSY_TIMEOUT 秒，而不是直接报 database is locked
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL 下 NORMAL 已能保证数据库不损坏，只可能丢掉断电前最后一批
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            logging.warning(f"[BattleStore] 无法打开战斗档案数据库 {self.db_path}，本次只保留内存记录: {e}")
+            self._disabled = True
+        return self._conn
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._writer_loop, name="BattleStoreWriter", daemon=True)
+            self._writer.start()
+
+    def _writer_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    # --- 写入 ---
+    def record(self, row: BattleResultRow):
+        """缓冲一条战斗结果，由后台线程批量写入"""
+        if not row.recorded_at:
+            row.recorded_at = time.time()
+        with self._pending_lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        self._ensure_writer()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """把缓冲中的结果在一个事务中写入数据库，返回写入条数"""
+        with self._pending_lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        with self._db_lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO battle_results (recorded_at, name, mode, level, result, battles, deck) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(r.recorded_at, r.name, r.mode, r.level, r.result, r.battles, r.deck) for r in rows],
+                    )
+            except sqlite3.Error as e:
+                logging.warning(f"[BattleStore] 写入 {len(rows)} 条战斗记录失败: {e}")
+                return 0
+        return len(rows)
+
+    def close(self):
+        """停止后台线程并写入剩余缓冲"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._writer is not None:
+            self._writer.join(timeout=self.flush_interval + 1)
+            self._writer = None
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._stopped.clear()
+
+    # --- 查询 ---
+    def _aggregate(self, filters: dict, group_by_deck: bool) -> dict:
+        """按条件汇总，group_by_deck 为 True 时返回 {卡组: EnemyHistory}，否则返回 {None: EnemyHistory}"""
+        self.flush()
+        clauses, params = [], []
+        for column in ("name", "mode", "deck"):
+            if filters.get(column) is not None:
+                clauses.append(f"{column} = ?")
+                params.append(filters[column])
+        if filters.get("level_range") is not None:
+            clauses.append("level BETWEEN ? AND ?")
+            params.extend(filters["level_range"])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        deck_column = "deck" if group_by_deck else "NULL"
+
+        histories = {}
+        with self._db_lock:
+            conn = self._connect()
+            if conn is None:
+                return histories
+            rows = conn.execute(
+                f"SELECT {deck_column}, result, COUNT(*), SUM(battles) FROM battle_results {where} "
+                f"GROUP BY {deck_column}, result",
+                params,
+            ).fetchall()
+
+        for deck, result, count, battles in rows:
+            history = histories.setdefault(deck, EnemyHistory())
+            if result == RESULT_WIN:
+                history.wins += count
+                history.retries += battles - count
+                history.losses += battles - count
+            elif result == RESULT_FORCED_RELEASE:
+                # 强制放生前打的每一场都输了
+                history.releases += count
+                history.forced_releases += count
+                history.losses += battles
+            else:
+                # 与内存档案一致，主动放生只计放生次数，不计入胜负
+                history.releases += count
+        return histories
+
+    def query_history(
+        self,
+        name: Optional[str] = None,
+        mode: Optional[str] = None,
+        level_range: Optional[Tuple[int, int]] = None,
+        deck: Optional[str] = None,
+    ) -> EnemyHistory:
+        """
+        按条件汇总历史战绩，条件为 None 时不限制。
+        level_range 为闭区间 (最低等级, 最高等级)。
+        """
+        filters = {"name": name, "mode": mode, "level_range": level_range, "deck": deck}
+        return self._aggregate(filters, group_by_deck=False).get(None, EnemyHistory())
+
+    def query_deck_history(
+        self,
+        name: str,
+        mode: str,
+        level_range: Optional[Tuple[int, int]] = None,
+    ) -> Dict[str, EnemyHistory]:
+        """一次查询拿到某敌人在各个卡组下的历史战绩"""
+        filters = {"name": name, "mode": mode, "level_range": level_range}
+        return self._aggregate(filters, group_by_deck=True)
+
+    def win_rate(self, name: str, mode: str, level_range: Optional[Tuple[int, int]] = None) -> Optional[float]:
+        return self.query_history(name, mode, level_range).win_rate
+
+    def average_retries(self, name: str, mode: str, level_range: Optional[Tuple[int, int]] = None) -> Optional[float]:
+        return self.query_history(name, mode, level_range).avg_retries
+
+
+# 全局实例，进程退出时自动写入剩余缓冲
+store = BattleStore()
+atexit.register(store.close)
@@ -0,0 +1,73 @@
+# input: battle_store 中按 名字/状态/等级段/卡组 汇总的历史战绩
+# output: 为 battle_manager 提供自适应卡组选择
+# pos: 自适应卡组策略(可选功能)，挑选期望重试次数最少的卡组
+
+import logging
+import random
+from typing import Dict, List, Optional, Tuple
+
+from . import battle_store
+
+# 等级段宽度：LV.23 归入 20~29 段
+LEVEL_BAND = 10
+
+
+def level_band(level: int) -> Tuple[int, int]:
+    """返回等级所在的等级段(闭区间)"""
+    low = (max(level, 0) // LEVEL_BAND) * LEVEL_BAND
+    return low, low + LEVEL_BAND - 1
+
+
+def expected_retries(history: battle_store.EnemyHistory) -> float:
+    """
+    每次击杀期望的重试场数(失败场数 / 胜场数)。
+    分子分母各加 1 做平滑，避免只打过一两场的卡组被误判成 0 或无穷大。
+    """
+    return (history.losses + 1) / (history.wins + 1)
+
+
+def choose_deck(
+    name: str,
+    mode: str,
+    level: int,
+    configured_deck: str,
+    candidates: List[str],
+    explore_rate: float = 0.1,
+    min_samples: int = 5,
+    rng: Optional[random.Random] = None,
+) -> Tuple[str, str]:
+    """
+    epsilon-greedy 选卡组。
+
+    Args:
+        configured_deck: 界面上配置的卡组，数据不足时回退到它
+        candidates: 允许选择的卡组(用户配置过的卡组)
+        explore_rate: 随机尝试其他卡组的概率
+        min_samples: 一个卡组至少要有多少场(胜+负)记录才参与比较
+
+    Returns:
+        (卡组名, 选择原因)，原因用于日志
+    """
+    rng = rng or random
+    band = level_band(level)
+    histories: Dict[str, battle_store.EnemyHistory] = battle_store.store.query_deck_history(name, mode, band)
+
+    known = {
+        deck: expected_retries(histories[deck])
+        for deck in candidates
+        if deck in histories and histories[deck].wins + histories[deck].losses >= min_samples
+    }
+    if not known:
+        return configured_deck, f"LV.{band[0]}~{band[1]} 历史数据不足，使用配置卡组"
+
+    if len(candidates) > 1 and rng.random() < explore_rate:
+        # 探索：优先尝试数据最少的卡组
+        fewest = min(candidates, key=lambda deck: histories[deck].wins + histories[deck].losses if deck in histories else 0)
+        return fewest, "随机探索"
+
+    best = min(known, key=known.get)
+    return best, f"LV.{band[0]}~{band[1]} 期望重试 {known[best]:.2f} 次"
+
+
+def log_choice(name: str, mode: str, level: int, deck: str, reason: str):
+    logging.info(f"[DeckPolicy] {name} LV.{level} {mode} -> {deck} ({reason})")
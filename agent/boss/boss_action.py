@@ -4,7 +4,8 @@ from maa.context import Context
 from . import boss_manager
 import logging
 import json
-from utils.common_func import dynamic_set_focus
+import time
+from utils.common_func import dynamic_set_focus, sleep_until
 
 @AgentServer.custom_action("reset_boss_data")
 class ResetBossData(CustomAction):
@@ -14,7 +15,9 @@ class ResetBossData(CustomAction):
         context: Context,
         argv: CustomAction.RunArg,
     ) -> CustomAction.RunResult:
-        boss_manager.boss_stats.current_battles = 0
+        stats = boss_manager.get_boss_stats()
+        stats.store("current_battles", 0)
+        stats.reset_polling()
         logging.info(f"[{argv.node_name}] 重置BOSS已战斗次数")
         return CustomAction.RunResult(success=True)
     
@@ -27,11 +30,12 @@ class AddBossBattles(CustomAction):
         argv: CustomAction.RunArg,
     ) -> CustomAction.RunResult:
         # 增加战斗次数
-        boss_manager.boss_stats.current_battles += 1
-        logging.info(f"[{argv.node_name}] BOSS战斗计数 +1，当前: {boss_manager.boss_stats.current_battles}")
+        stats = boss_manager.get_boss_stats()
+        current_battles = stats.incr("current_battles")
+        logging.info(f"[{argv.node_name}] BOSS战斗计数 +1，当前: {current_battles}")
 
         # 设定战斗计数通知
-        focus_msg = f"已完成第 {boss_manager.boss_stats.current_battles} 场BOSS战"
+        focus_msg = f"已完成第 {current_battles} 场BOSS战"
         dynamic_set_focus(context,target_node="输出BOSS计数",trigger="RECO_OK",focus_msg=focus_msg)
 
         return CustomAction.RunResult(success=True)
@@ -54,8 +58,35 @@ class LoadBossData(CustomAction):
         target_rank = params.get("target_rank", -1)
 
         # 设置参数
-        boss_manager.boss_stats.max_battles = max_battles
-        boss_manager.boss_stats.target_rank = target_rank
+        stats = boss_manager.get_boss_stats()
+        stats.max_battles = max_battles
+        stats.target_rank = target_rank
 
-        logging.info(f"[{argv.node_name}] 加载BOSS配置: max_battles={max_battles}, target_rank={target_rank}")
+        # 暂停时的轮询间隔上下限为可选参数(秒)
+        stats.poll_floor = float(params.get("poll_floor", stats.poll_floor))
+        stats.poll_ceiling = max(float(params.get("poll_ceiling", stats.poll_ceiling)), stats.poll_floor)
+        stats.reset_polling()
+
+        logging.info(
+            f"[{argv.node_name}] 加载BOSS配置: max_battles={max_battles}, target_rank={target_rank}, "
+            f"轮询间隔 {stats.poll_floor:.0f}~{stats.poll_ceiling:.0f} 秒"
+        )
+        return CustomAction.RunResult(success=True)
+
+
+@AgentServer.custom_action("boss_pause_wait")
+class BossPauseWait(CustomAction):
+    """已达到目标排名时，按排名变化速度等待一段时间再去查看排名"""
+    def run(
+        self,
+        context: Context,
+        argv: CustomAction.RunArg,
+    ) -> CustomAction.RunResult:
+        stats = boss_manager.get_boss_stats()
+        interval = stats.next_poll_interval()
+        logging.info(
+            f"[{argv.node_name}] 排名 {stats.current_rank} (目标 {stats.target_rank})，"
+            f"变化速度 {stats.drift_rate() * 60:+.2f} 名/分钟，{interval:.0f} 秒后再查看"
+        )
+        sleep_until(time.monotonic() + interval, should_abort=lambda: context.tasker.stopping)
         return CustomAction.RunResult(success=True)
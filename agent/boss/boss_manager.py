@@ -2,15 +2,74 @@
 # output: 为 boss_action 提供数据管理。
 # pos: 管理 boss 战相关数据。
 
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
+import time
+from utils import session
+from utils.atomic import AtomicFields
+
+# 估算排名变化速度时只看最近这段时间的记录(秒)
+DRIFT_WINDOW_SECONDS = 600
 
 @dataclass
-class BossStats:
+class BossStats(AtomicFields):
     max_battles: int = -1 # 战斗次数上限,负数表示无限
     current_battles: int = 0 # 当前已战斗次数
     target_rank: int = -1 # 目标排名,负数表示无论当前什么排名都继续战斗
     current_rank: int = 999 # 当前排名
 
+    # --- 暂停时的排名轮询 ---
+    poll_floor: float = 5.0 # 最短轮询间隔(秒)
+    poll_ceiling: float = 120.0 # 最长轮询间隔(秒)
+    poll_interval: float = 5.0 # 当前轮询间隔(秒)
+    # 排名时间序列 (单调时钟秒, 排名)，只保留最近的记录
+    rank_history: deque = field(default_factory=lambda: deque(maxlen=64))
+
+    def record_rank(self, rank: int):
+        """更新当前排名，并记入时间序列"""
+        self.current_rank = rank
+        self.rank_history.append((time.monotonic(), rank))
+
+    def reset_polling(self):
+        """清空排名记录，轮询间隔回到下限"""
+        self.rank_history.clear()
+        self.poll_interval = self.poll_floor
+
+    def drift_rate(self) -> float:
+        """
+        最近一段时间排名的变化速度(名/秒)，正数表示排名在往后掉。
+        用最小二乘拟合斜率，单次 OCR 抖动不会造成大的误判。
+        """
+        if not self.rank_history:
+            return 0.0
+        latest = self.rank_history[-1][0]
+        samples = [(t, r) for t, r in self.rank_history if latest - t <= DRIFT_WINDOW_SECONDS]
+        if len(samples) < 2:
+            return 0.0
+        mean_t = sum(t for t, _ in samples) / len(samples)
+        mean_r = sum(r for _, r in samples) / len(samples)
+        var_t = sum((t - mean_t) ** 2 for t, _ in samples)
+        if var_t == 0:
+            return 0.0
+        return sum((t - mean_t) * (r - mean_r) for t, r in samples) / var_t
+
+    def next_poll_interval(self) -> float:
+        """
+        计算暂停期间下一次查看排名前要等多久。
+        排名稳定或在变好时间隔翻倍；在往后掉时，按掉到目标排名所需时间的一半来等，
+        离目标越近等得越短。结果限制在 [poll_floor, poll_ceiling] 之间。
+        """
+        margin = self.target_rank - self.current_rank
+        drift = self.drift_rate()
+        if margin <= 0:
+            interval = self.poll_floor
+        elif drift <= 0:
+            interval = self.poll_interval * 2
+        else:
+            interval = margin / drift / 2
+        self.poll_interval = min(max(interval, self.poll_floor), self.poll_ceiling)
+        return self.poll_interval
+
     @property
     def should_stop(self) -> bool:
         """
@@ -32,5 +91,7 @@ class BossStats:
         else:
             return False
         
-boss_stats = BossStats()
+def get_boss_stats() -> BossStats:
+    """当前 tasker 的 BOSS 战数据，每个游戏窗口各有一份"""
+    return session.current().get("boss", BossStats)
 
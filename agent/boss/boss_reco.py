@@ -7,7 +7,9 @@ from maa.custom_recognition import CustomRecognition
 from maa.context import Context
 from . import boss_manager
 import logging
-from utils.common_func import extract_number_from_ocr
+from utils.common_func import extract_numbers_from_ocr
+from utils import frame_gate
+from utils import ocr_cache
 
 
 @AgentServer.custom_recognition("should_boss_stop")
@@ -19,7 +21,7 @@ class ShouldBossStop(CustomRecognition):
         argv: CustomRecognition.AnalyzeArg,
     ) -> CustomRecognition.AnalyzeResult:
         # 别名设置
-        stats = boss_manager.boss_stats
+        stats = boss_manager.get_boss_stats()
 
         # 记录当前战斗次数进度，如果最大战斗次数为负一，显示为无穷。
         if stats.max_battles == -1:
@@ -40,15 +42,22 @@ class ShouldBossStop(CustomRecognition):
 @AgentServer.custom_recognition("should_boss_pause")
 class ShouldBossPause(CustomRecognition):
     """判断是否已达到目标排名，需要等待一会"""
+
+    # boss 界面标识和排名区域都没变化时，复用上次"不暂停"的结果。
+    # 排名区域按像素精确比较：排名差一位时感知哈希往往不变，会一直复用过期的"继续战斗"。
+    # 暂停(命中)时不复用：每次轮询都要把排名记入时间序列，排名持平的记录才能让轮询间隔变长；
+    # 排名没变时 OCR 由 ocr_cache 按像素复用，实际多出的只有界面确认
+    @frame_gate.gated(rois=["BossPage"], exact_rois=["CurrentRank"], cache_hits=False)
     def analyze(
         self,
         context: Context,
         argv: CustomRecognition.AnalyzeArg,
     ) -> CustomRecognition.AnalyzeResult:
         # 别名设置
-        stats = boss_manager.boss_stats
+        stats = boss_manager.get_boss_stats()
 
-        # 确认当前在 boss 界面
+        # 确认当前在 boss 界面。不在 boss 界面时也会轮询这个节点，界面多半未命中，
+        # 所以先确认再读排名，不和排名 OCR 并发(已经开始的 OCR 没法取消，未命中时反而要等它跑完)
         reco_detail = context.run_recognition("BossPage",argv.image)
         if not reco_detail or not reco_detail.hit:
             msg = "未识别到 boss 界面."
@@ -57,14 +66,14 @@ class ShouldBossPause(CustomRecognition):
         # ocr 获取当前排名
         current_rank = 999
         try:
-            current_rank = extract_number_from_ocr(context,argv.image,"CurrentRank")
+            current_rank = self.read_rank(context,argv.image)
         except ValueError as e:
             msg = f"[{argv.node_name}] 排名识别失败，使用默认值继续: {e}"
             logging.error(msg)
             return CustomRecognition.AnalyzeResult(box=None, detail=msg)
 
-        # 更新储存的当前排名
-        stats.current_rank = current_rank
+        # 更新储存的当前排名，并记入排名时间序列
+        stats.record_rank(current_rank)
 
         # 记录排名与目标数
         if stats.target_rank == -1:
@@ -80,3 +89,14 @@ class ShouldBossPause(CustomRecognition):
             msg = f"{rank_report}\n-> 未达标，继续战斗。"
             return CustomRecognition.AnalyzeResult(box=None, detail=msg)
 
+    @staticmethod
+    def read_rank(context: Context, image) -> int:
+        """
+        OCR 读取当前排名。排名区域以 pipeline 中 CurrentRank 节点的 roi 为准，
+        只取落在该区域内的文字块，避免把区域边缘的其他文字拼进排名。
+        """
+        rank_roi = ocr_cache.node_roi(context, "CurrentRank")
+        if rank_roi is None:
+            raise ValueError("CurrentRank 节点没有固定的 roi")
+        return extract_numbers_from_ocr(context, image, "CurrentRank", {"rank": rank_roi})["rank"]
+
@@ -4,13 +4,16 @@ from maa.context import Context
 from . import lab_manager
 import logging
 import json
+import time
 from utils import common_func
+from utils import frame_gate
 
 @AgentServer.custom_action("select_all_low_star")
 class SelectAllLowStar(CustomAction):
     """依次点击所有一二三星卡"""
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
-        common_func.group_click(context, lab_manager.batch_select_rois)
+        click_options = common_func.parse_click_options(argv.custom_action_param, argv.node_name)
+        common_func.group_click(context, lab_manager.batch_select_rois, **click_options)
         return CustomAction.RunResult(success=True)
     
     
@@ -20,7 +23,8 @@ class ClickAllCard(CustomAction):
     逐个点击当前页面上的全部六张卡牌
     """
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
-        common_func.group_click(context,lab_manager.card_slots)
+        click_options = common_func.parse_click_options(argv.custom_action_param, argv.node_name)
+        common_func.group_click(context, lab_manager.card_slots, **click_options)
 
         return CustomAction.RunResult(success=True)
     
@@ -30,7 +34,7 @@ class UpdateLabMode(CustomAction):
     把当前节点的名字存起来
     """
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
-        lab_manager.current_mode = argv.node_name
+        lab_manager.get_state().current_mode = argv.node_name
         return CustomAction.RunResult(success=True)
     
 @AgentServer.custom_action("disable_lab_mode")
@@ -39,10 +43,89 @@ class DisableLabMode(CustomAction):
     关闭当前正在执行的实验室任务模式
     """
     def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
-        context.override_pipeline({
-            lab_manager.current_mode: {
+        common_func.apply_override(context, {
+            lab_manager.get_state().current_mode: {
                 "enabled": False
             }
         })
 
-        return CustomAction.RunResult(success=True)
\ No newline at end of file
+        return CustomAction.RunResult(success=True)
+
+
+@AgentServer.custom_action("reset_lab_session")
+class ResetLabSession(CustomAction):
+    """
+    开始实验室任务时，清空上一次任务留下的翻页记录
+    """
+    def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
+        lab_manager.get_state().sirius_pages.reset()
+        return CustomAction.RunResult(success=True)
+
+
+# 点击下一页后，最多等多久(秒)卡牌区域还没变化就认为没翻过去
+PAGE_TURN_TIMEOUT = 2.0
+# 等待翻页期间的截图间隔(秒)
+PAGE_TURN_POLL = 0.1
+
+
+def card_hashes(context: Context):
+    """截一张图，返回每个卡槽的感知哈希"""
+    image = context.tasker.controller.post_screencap().wait().get()
+    return tuple(frame_gate.dhash(image, roi) for roi in lab_manager.card_slots)
+
+
+def turn_sirius_page(context: Context, next_roi) -> bool:
+    """点一次下一页，返回卡牌区域是否在 PAGE_TURN_TIMEOUT 内变化(即确实翻过去了)"""
+    before = card_hashes(context)
+    common_func.group_click(context, [next_roi])
+    deadline = time.monotonic() + PAGE_TURN_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(PAGE_TURN_POLL)
+        if frame_gate.hamming(before, card_hashes(context)) > frame_gate.DEFAULT_TOLERANCE:
+            return True
+    return False
+
+
+@AgentServer.custom_action("sirius_jump_to_known_page")
+class SiriusJumpToKnownPage(CustomAction):
+    """
+    进入天狼星选卡界面后，直接翻过本次任务中已确认没有整页狼的页。
+    每次点击下一页后都等卡牌区域的画面变化，确认翻过去了才计数；
+    点击被吞掉时页码就对不上了，这时清空翻页记录，从当前页开始逐页查找。
+    """
+    def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
+        pages = lab_manager.get_state().sirius_pages
+        pages.start_pass()
+        if pages.skip_pages <= 0:
+            return CustomAction.RunResult(success=True)
+
+        # 翻页按钮位置以 pipeline 中的下一页节点为准
+        node_data = context.get_node_data("实验室天狼星下一页") or {}
+        next_roi = node_data.get("recognition", {}).get("param", {}).get("roi")
+        if not next_roi:
+            logging.warning(f"[{argv.node_name}] 未读取到下一页按钮位置，从第 1 页开始逐页查找")
+            return CustomAction.RunResult(success=True)
+
+        skip_pages = pages.skip_pages
+        for _ in range(skip_pages):
+            if not turn_sirius_page(context, next_roi):
+                pages.lose_track()
+                logging.warning(f"[{argv.node_name}] 第 {pages.current_page} 页翻页未确认，清空翻页记录，从当前页开始逐页查找")
+                return CustomAction.RunResult(success=True)
+            pages.jumped()
+        logging.info(f"[{argv.node_name}] 跳过已确认没有整页狼的 {skip_pages} 页，从第 {pages.current_page} 页开始查找")
+        return CustomAction.RunResult(success=True)
+
+
+@AgentServer.custom_action("sirius_next_page")
+class SiriusNextPage(CustomAction):
+    """
+    当前页没有整页狼，记录下来后翻到下一页。翻页没确认时页码不可信，本轮不再记录
+    """
+    def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
+        pages = lab_manager.get_state().sirius_pages
+        pages.mark_useless()
+        if not turn_sirius_page(context, list(argv.box)):
+            pages.lose_track()
+            logging.warning(f"[{argv.node_name}] 翻页未确认，清空翻页记录，本轮剩下的页不再计入")
+        return CustomAction.RunResult(success=True)
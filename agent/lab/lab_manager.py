@@ -2,6 +2,9 @@
 # output: lab_action
 # pos: 存放各种实验室 roi 还有其他信息
 
+from dataclasses import dataclass, field
+from utils import session
+
 # 一二三星卡全选按钮
 batch_select_rois = {
     "btn_select_1_star": [1152,428,63,14],
@@ -27,7 +30,57 @@ card_slots = [
     [947,457,50,55], # Slot 6
 ]
 
-# 标记当前正在执行的实验室任务模式
-# 该变量的值为模式任务起点对应的节点名
-# 会在运行时动态更新
-current_mode = "开始低星实验"
\ No newline at end of file
+
+@dataclass
+class SiriusPageIndex:
+    """
+    天狼星实验的翻页记录。
+    卡牌按星级从低到高排序，实验只会用掉整页狼所在页及之后的卡，前面的页内容不会变化，
+    所以同一次任务中已经确认没有整页狼的页，之后每轮都可以直接翻过去，不用再做模板匹配。
+    页码按翻页次数计算，进入选卡界面时总是从第 1 页开始。
+    有一次翻页没能确认时，页码就不可信了，本轮不再记录，下一轮从第 1 页重新开始记。
+    """
+    # 当前所在页(从 1 开始)
+    current_page: int = 1
+    # 从第 1 页开始，连续确认没有整页狼的页数
+    skip_pages: int = 0
+    # 本轮的页码是否可信
+    tracking: bool = True
+
+    def start_pass(self):
+        """重新进入选卡界面，回到第 1 页"""
+        self.current_page = 1
+        self.tracking = True
+
+    def mark_useless(self):
+        """当前页没有整页狼，即将翻到下一页"""
+        if self.tracking and self.current_page == self.skip_pages + 1:
+            self.skip_pages += 1
+        self.current_page += 1
+
+    def jumped(self, pages: int = 1):
+        self.current_page += pages
+
+    def lose_track(self):
+        """翻页没能确认，不知道现在在哪一页：清空记录，本轮剩下的页都不再计入"""
+        self.skip_pages = 0
+        self.tracking = False
+
+    def reset(self):
+        self.current_page = 1
+        self.skip_pages = 0
+
+
+@dataclass
+class LabState:
+    # 标记当前正在执行的实验室任务模式
+    # 该变量的值为模式任务起点对应的节点名
+    # 会在运行时动态更新
+    current_mode: str = "开始低星实验"
+    # 天狼星实验翻页记录，每次开始实验室任务时重置
+    sirius_pages: SiriusPageIndex = field(default_factory=SiriusPageIndex)
+
+
+def get_state() -> LabState:
+    """当前 tasker 的实验室状态，每个游戏窗口各有一份"""
+    return session.current().get("lab", LabState)
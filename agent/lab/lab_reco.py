@@ -2,6 +2,7 @@ from maa.agent.agent_server import AgentServer
 from maa.custom_recognition import CustomRecognition
 from maa.context import Context
 from . import lab_manager
+from utils import color_match
 import logging
 
 
@@ -47,26 +48,18 @@ class CheckLabFilter(CustomRecognition):
         else:
             raise ValueError(f"[{argv.node_name}] 严重错误:未在节点名称中找到\"四星\"/\"天狼星\".请确保节点名称正确且在正确的节点调用此识别")
 
-        # 遍历字典中的每一个配置
+        # 一次读出四个筛选框的勾选状态，颜色范围取自 LabFilter 节点
+        names = list(lab_manager.filter_rois)
+        rois = [lab_manager.filter_rois[name] for name in names]
+        states = color_match.match_node_bitmap(context, argv.image, "LabFilter", rois)
+
         # name 是键 (例如 "filter_hide_deployed")
         # roi 是值 (例如 [1136, 298, 15, 14])
-        for name, roi in lab_manager.filter_rois.items():
+        for name, roi, state in zip(names, rois, states):
             # 取出此处期望的勾选/取消状态
             # 这里故意不使用 `get` 来使用默认值，防止配置漏写无法发现
             expected_state = target_config[name]
-            reco_detail = context.run_recognition(
-                "LabFilter",
-                argv.image,
-                {
-                    "LabFilter": {
-                        "roi": roi
-                    }
-                }
-            )
-
-            current_state = False
-            if reco_detail and reco_detail.hit:
-                current_state = True
+            current_state = bool(state)
             # --- 当前 != 期望，则需要点击 ---
             if current_state != expected_state:
                 action = "勾选" if expected_state else "取消"
@@ -77,9 +70,66 @@ class CheckLabFilter(CustomRecognition):
                     "roi": roi
                 })
 
+        return CustomRecognition.AnalyzeResult(
+            box=[0, 0, 0, 0],
+            detail={
+                "click_targets": to_click_list,
+                "filter_states": color_match.to_bits(states)
+            }
+        )
+
+@AgentServer.custom_recognition("occupied_card_slots")
+class OccupiedCardSlots(CustomRecognition):
+    """
+    找出当前页面上有卡牌的卡槽，返回 ROI 以供点击.
+    用 LabEmptySlot 节点(实验室空白.png)在整个卡牌区域做一次模板匹配，
+    匹配到空白的卡槽跳过，其余卡槽都视为有卡。
+    深色卡面也可能和空白图案有几分像，所以匹配阈值设得和整页狼一样高(0.9)，
+    并且匹配框要大部分落在卡槽里才算空，宁可多点一张空槽，也不能漏掉真卡。
+    """
+
+    # 匹配框与卡槽的重叠面积至少占二者中较小者的比例。空白模板(45x46)比卡槽点击区域略小
+    min_overlap_ratio = 0.7
+
+    def analyze(
+        self,
+        context: Context,
+        argv: CustomRecognition.AnalyzeArg,
+    ) -> CustomRecognition.AnalyzeResult:
+        empty_slots = set()
+        reco_detail = context.run_recognition("LabEmptySlot", argv.image)
+        if reco_detail and reco_detail.hit:
+            for result in reco_detail.filtered_results:
+                index = self.slot_of([int(v) for v in result.box])
+                if index is not None:
+                    empty_slots.add(index)
+
+        to_click_list = [
+            {"name": f"slot_{index + 1}", "roi": roi}
+            for index, roi in enumerate(lab_manager.card_slots)
+            if index not in empty_slots
+        ]
+        if empty_slots:
+            logging.info(f"[{argv.node_name}] 卡槽 {sorted(i + 1 for i in empty_slots)} 为空，只点击剩余 {len(to_click_list)} 张卡。")
+
+        # 一张卡都没有时也返回命中，由后续"未选择卡牌"弹窗结束当前模式
         return CustomRecognition.AnalyzeResult(
             box=[0, 0, 0, 0],
             detail={
                 "click_targets": to_click_list
             }
-        )
\ No newline at end of file
+        )
+
+    @classmethod
+    def slot_of(cls, box):
+        """返回匹配框覆盖的卡槽下标，和任何卡槽的重叠都不够时返回 None"""
+        x, y, w, h = box
+        if w <= 0 or h <= 0:
+            return None
+        for index, (sx, sy, sw, sh) in enumerate(lab_manager.card_slots):
+            overlap_w = min(x + w, sx + sw) - max(x, sx)
+            overlap_h = min(y + h, sy + sh) - max(y, sy)
+            overlap = max(overlap_w, 0) * max(overlap_h, 0)
+            if overlap >= cls.min_overlap_ratio * min(w * h, sw * sh):
+                return index
+        return None
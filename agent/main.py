@@ -1,6 +1,8 @@
 import sys
 import os
 import logging
+import signal
+import threading
 
 # 将脚本所在目录添加到模块搜索路径，确保能找到同目录下的模块
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,10 +22,46 @@ from boss import boss_action
 from boss import boss_reco
 from utils import common_action
 from utils import common_reco
-from battle import battle_action,battle_reco
+from utils import common_sink
+from utils import perf_monitor
+from utils import session
+from battle import battle_action,battle_reco,battle_store
 from lab import lab_action,lab_reco
 
 
+# 停止时等待 AgentServer.shut_down 的最长时间(秒)
+SHUT_DOWN_TIMEOUT = 3.0
+
+
+def wait_until_stopped():
+    """
+    等待 agent 服务结束，或者收到停止信号(supervisor 停止/重启 agent 时发送)。
+    AgentServer.join 阻塞在原生代码里，期间主线程执行不了信号处理函数，
+    所以放到后台线程等待，主线程只等事件，收到信号后照常走完后面的收尾。
+    """
+    stopped = threading.Event()
+
+    def join():
+        AgentServer.join()
+        stopped.set()
+
+    def on_stop_signal(signum, frame):
+        logging.info(f"收到停止信号 {signum}，准备退出")
+        stopped.set()
+
+    # POSIX 下 supervisor 发送 SIGTERM；Windows 下发送 CTRL_BREAK_EVENT，对应 SIGBREAK
+    for name in ("SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), on_stop_signal)
+
+    threading.Thread(target=join, name="AgentServerJoin", daemon=True).start()
+    try:
+        while not stopped.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        logging.info("收到中断，准备退出")
+
+
 def main():
     logging.basicConfig(level=logging.INFO) # 输出日志，看看情况。
 
@@ -36,9 +74,35 @@ def main():
         
     socket_id = sys.argv[-1]
 
+    # 所有自定义节点都已注册，让它们按 tasker 使用各自的会话状态
+    session.install()
+    # 给它们加上耗时统计
+    perf_monitor.install()
+
+    # 由 supervisor 启动时，定期把统计快照写到指定文件供汇总
+    snapshot_path = os.environ.get(perf_monitor.SNAPSHOT_PATH_ENV)
+    if snapshot_path:
+        interval = float(os.environ.get(perf_monitor.SNAPSHOT_INTERVAL_ENV, "30"))
+        perf_monitor.start_snapshot_writer(snapshot_path, interval)
+
     AgentServer.start_up(socket_id)
-    AgentServer.join()
-    AgentServer.shut_down()
+    wait_until_stopped()
+    # 服务结束时输出各节点耗时分布
+    perf_monitor.dump_report()
+    if snapshot_path:
+        perf_monitor.write_snapshot(snapshot_path)
+    # 写入尚未提交的战斗档案
+    battle_store.store.close()
+    # 收到停止信号时客户端可能还连着，shut_down 可能一直等下去；
+    # 该保存的都已保存，最多等 SHUT_DOWN_TIMEOUT 秒后直接退出
+    shutter = threading.Thread(target=AgentServer.shut_down, name="AgentServerShutDown", daemon=True)
+    shutter.start()
+    shutter.join(SHUT_DOWN_TIMEOUT)
+    if shutter.is_alive():
+        # 原生库的线程还在时正常退出解释器会在析构阶段崩溃，跳过析构直接结束进程
+        logging.warning("AgentServer 未能在时限内关闭，直接退出")
+        logging.shutdown()
+        os._exit(0)
 
 
 if __name__ == "__main__":
@@ -15,7 +15,7 @@ from utils import common_func
 class ResetPotionData(CustomAction):
     """重置药水数据"""
     def run(self,context:Context,argv:CustomAction.RunArg) -> bool:
-        recover_manager.potion_stats.reset_usage()
+        recover_manager.get_potion_stats().reset_usage()
         logging.info(f"[重置吃药数据] 重置已使用药水数量")
         return True
 
@@ -44,14 +44,22 @@ class LoadPotionLimit(CustomAction):
         bc_small = int(params["bc_small"])
 
         # 设置药水限制数
-        stats = recover_manager.potion_stats # 简写一下
+        stats = recover_manager.get_potion_stats() # 简写一下
         stats.ap.set_limit(ap_big,ap_small)
         stats.bc.set_limit(bc_big,bc_small)
 
+        # 库存跟踪为可选参数，不填时保持关闭(每次进恢复界面都读库存)
+        # 开启示例: "track_stock": true, "stock_verify_interval": 5
+        if "track_stock" in params:
+            stats.track_stock = str(params["track_stock"]).lower() == "true"
+        if "stock_verify_interval" in params:
+            stats.stock_verify_interval = max(int(params["stock_verify_interval"]), 0)
+
         msg = (
             f"[{argv.node_name}] 药水设置载入 | "
             f"AP(大/小): {stats.ap.big.limit}/{stats.ap.small.limit} | "
             f"BC(大/小): {stats.bc.big.limit}/{stats.bc.small.limit} | "
+            f"库存跟踪: {f'每 {stats.stock_verify_interval} 瓶核对' if stats.track_stock else '关闭'}"
         )
         logging.info(msg)
         return CustomAction.RunResult(success=True)
@@ -78,10 +86,17 @@ class LoadFreeRecover(CustomAction):
         free_recover = str(params["free_recover"]).lower() == "true"
 
         # 设置免费恢复情况
-        stats = recover_manager.potion_stats # 简写一下
+        stats = recover_manager.get_potion_stats() # 简写一下
         stats.use_free_recover = free_recover
+
+        # 游戏每日刷新时间为可选参数，用于判断免费恢复是否已经刷新
+        if "reset_hour" in params:
+            stats.free_reset_hour = int(params["reset_hour"]) % 24
+
+        used_today = [kind for kind in ("AP", "BC") if stats.is_free_used(kind)]
         msg = (
             f"免费吃药: {'是' if stats.use_free_recover else '否'}"
+            f"{f' (今日已使用: {used_today})' if used_today else ''}"
         )
         logging.info(msg)
         return CustomAction.RunResult(success=True)
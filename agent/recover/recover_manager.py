@@ -3,29 +3,84 @@
 # pos: 这里用来管理节点使用的数据
 
 from dataclasses import dataclass,field
-from typing import Tuple
+from datetime import datetime, timedelta
+import logging
+import os
+from typing import Dict, Optional, Tuple
+from utils import file_lock
+from utils.atomic import AtomicFields
+from utils import session
+
+# 免费恢复使用记录，放在 agent 运行目录下的 data 文件夹
+# 内容为 实例标识(设备) -> 药水种类(AP/BC) -> 最近一次用掉免费恢复的游戏日，多开时每个设备各记各的
+FREE_RECOVER_FILE = os.path.join("data", "free_recover.json")
+# 游戏每日刷新时间(小时)，早于该时间算前一天
+DAILY_RESET_HOUR = 5
 
 @dataclass
-class SinglePotion:
-    """定义每种药水记录"""
+class SinglePotion(AtomicFields):
+    """定义每种药水记录，usage/stock 的修改都在对象锁内完成"""
     name: str = "未命名药品"
     usage: int = 0
     limit: int = 0
     stock: int = 0
 
+    # --- 库存账本 ---
+    stock_known: bool = False # 库存是否已经从画面读到过
+    uses_since_check: int = 0 # 上次读库存之后又用了几瓶
+    rejected_reading: Optional[int] = None # 上次被判为不合理的读数，再次读到相同值时才采用
+
 
     def reset_usage(self):
         """重置使用药水数"""
-        self.usage = 0
+        self.store("usage", 0)
+
+    def reset_stock(self):
+        """清空库存账本，下次进恢复界面时重新读库存"""
+        with self.locked():
+            self.stock_known = False
+            self.uses_since_check = 0
+            self.rejected_reading = None
+
+    def record_use(self):
+        """记一次使用：使用数加一，账本库存减一"""
+        with self.locked():
+            self.usage += 1
+            self.stock -= 1
+            self.uses_since_check += 1
+
+    def needs_stock_check(self, verify_interval: int) -> bool:
+        """
+        判断账本是否需要和画面核对。
+        没读过库存、上次读数不合理、距上次核对已用满 verify_interval 瓶、
+        或者账本自己减到了 0(可能与画面不一致，放弃吃药前要确认)时需要核对。
+        """
+        if not self.stock_known or self.rejected_reading is not None:
+            return True
+        if verify_interval > 0 and self.uses_since_check >= verify_interval:
+            return True
+        return self.stock <= 0 and self.uses_since_check > 0
+
+    def accept_stock_reading(self, reading: int) -> bool:
+        """
+        用画面读数校准账本，返回是否采用。
+        同一次运行中库存只会减少，读数比账本多时视为误识别，先不采用；
+        下次核对时如果读到同样的值(例如中途补充了库存)，再采用。
+        """
+        with self.locked():
+            if self.stock_known and reading > self.stock and reading != self.rejected_reading:
+                # 记下这个读数，下次进恢复界面时再读一次
+                self.rejected_reading = reading
+                return False
+            self.stock = reading
+            self.stock_known = True
+            self.uses_since_check = 0
+            self.rejected_reading = None
+            return True
 
     def get_status(self):
         """返回当前的药品状态数据"""
-        data = {
-            "name": self.name,
-            "stock": self.stock,
-            "usage": self.usage,
-            "limit": self.limit
-        }
+        data = self.snapshot("name", "stock", "usage", "limit")
         return data  # 把这个打包好的数据包扔回去
     
     def usage_report(self):
@@ -34,17 +89,19 @@ class SinglePotion:
             limit_report = "∞"
         else:
             limit_report = self.limit
-        msg = f"使用第 {self.usage}/{limit_report} 瓶 {self.name},剩余库存量 {self.stock}"
+        current = self.snapshot("usage", "stock")
+        msg = f"使用第 {current['usage']}/{limit_report} 瓶 {self.name},剩余库存量 {current['stock']}"
         return msg
     
     def should_use(self):
         """判断当前这种药品是否可用"""
-        if self.stock==0 or self.limit ==0: # 没有库存或者设置为不使用
-            return False
-        elif self.limit != -1 and self.usage >= self.limit: # 使用数量超过限制
-            return False
-        else:
-            return True
+        with self.locked():
+            if self.stock==0 or self.limit ==0: # 没有库存或者设置为不使用
+                return False
+            elif self.limit != -1 and self.usage >= self.limit: # 使用数量超过限制
+                return False
+            else:
+                return True
 
 
 @dataclass
@@ -62,6 +119,15 @@ class PotionType:
         self.big.limit = big_num
         self.small.limit = small_num
 
+    def reset_stock(self):
+        """清空大药和小药的库存账本"""
+        self.big.reset_stock()
+        self.small.reset_stock()
+
+    def needs_stock_check(self, verify_interval: int) -> bool:
+        """大药或小药任意一个需要核对时，读一次画面(一次读出两个库存)"""
+        return self.big.needs_stock_check(verify_interval) or self.small.needs_stock_check(verify_interval)
+
 
 @dataclass 
 class PotionManager:
@@ -72,6 +138,17 @@ class PotionManager:
     # 是否使用免费恢复
     use_free_recover:bool = True
 
+    # 库存跟踪：开启后只在需要核对时读库存，其余时间相信账本。默认关闭，每次都读库存
+    track_stock: bool = False
+    # 每使用多少瓶核对一次库存，0 为只在首次和账本归零时核对
+    stock_verify_interval: int = 5
+
+    # 免费恢复：药水种类(AP/BC) -> 最近一次用掉免费恢复的游戏日
+    free_used_days: Dict[str, str] = field(default_factory=dict)
+    free_reset_hour: int = DAILY_RESET_HOUR
+    # 免费恢复记录所属的实例(设备)，默认取当前会话的标识
+    instance: str = ""
+
     def __post_init__(self):
         """
         初始化各种设置。
@@ -87,10 +164,55 @@ class PotionManager:
         self.bc.big.name = "大战斗力恢复药"
         self.bc.small.name = "小战斗力恢复药"
 
+        # 读取之前保存的免费恢复记录
+        if not self.instance:
+            self.instance = session.current().identity or session.DEFAULT_KEY
+        self.load_free_state()
+
+    def load_free_state(self):
+        """从文件读取免费恢复记录，文件不存在或损坏时当作今天还没用过"""
+        data = file_lock.read_json(FREE_RECOVER_FILE, {})
+        record = data.get(self.instance) if isinstance(data, dict) else None
+        if isinstance(record, dict):
+            self.free_used_days = {str(k): str(v) for k, v in record.items()}
+        else:
+            self.free_used_days = {}
+
+    def is_free_used(self, potion_type: str) -> bool:
+        """今天(按游戏日)是否已经用过该种类的免费恢复"""
+        return self.free_used_days.get(potion_type) == game_day(self.free_reset_hour)
+
+    def mark_free_used(self, potion_type: str):
+        """记录今天已用掉免费恢复，并写入文件，重启后依然有效"""
+        today = game_day(self.free_reset_hour)
+        if self.free_used_days.get(potion_type) == today:
+            return
+        self.free_used_days[potion_type] = today
+        def update(data):
+            record = data.get(self.instance)
+            if not isinstance(record, dict):
+                record = data[self.instance] = {}
+            record[potion_type] = today
+
+        try:
+            # 多个 agent 进程共用这个文件，加锁后只改本实例的这一项，不覆盖其他实例刚写入的记录
+            file_lock.update_json(FREE_RECOVER_FILE, update)
+        except (OSError, TimeoutError) as e:
+            logging.warning(f"[PotionManager] 免费恢复记录保存失败，本次运行内仍然有效: {e}")
+
     def reset_usage(self):
-        """清除所有药品使用量,用于手动重置。"""
+        """清除所有药品使用量,用于手动重置。重置后库存也重新读取。"""
         self.ap.reset_usage()
         self.bc.reset_usage()
+        self.ap.reset_stock()
+        self.bc.reset_stock()
+
+def game_day(reset_hour: int = DAILY_RESET_HOUR, now: Optional[datetime] = None) -> str:
+    """返回当前所属的游戏日，例如刷新时间为 5 点时，凌晨 3 点仍算前一天"""
+    now = now or datetime.now()
+    return (now - timedelta(hours=reset_hour)).date().isoformat()
+
 
-# 创建总管
-potion_stats = PotionManager()
+# 总管按 tasker 分开创建，每个游戏窗口各用各的药
+def get_potion_stats() -> PotionManager:
+    return session.current().get("potion", PotionManager)
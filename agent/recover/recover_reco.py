@@ -8,6 +8,7 @@ from maa.context import Context
 from . import recover_manager
 import logging
 from utils import common_func
+from utils import ocr_cache
 
 logging.basicConfig(level=logging.INFO) 
 
@@ -23,6 +24,12 @@ class ShouldUsePotion(CustomRecognition):
         "close":[994,259,20,21]
     }
 
+    # 药水库存数字所在区域对应的 pipeline 节点，PotionStock 节点的 roi 是二者的并集，一次 OCR 读出两个库存
+    stock_nodes = {
+        "big": "BigPotion",
+        "small": "SmallPotion",
+    }
+
     # 当免费恢复按钮的识别分数达到0.9以上时，说明按钮可点击。
     free_available_threshold = 0.9
 
@@ -45,57 +52,85 @@ class ShouldUsePotion(CustomRecognition):
         # 获取当前处理的药水种类
         potion_type = str(params["potion_type"]).upper()
         if potion_type == "AP":
-            stats = recover_manager.potion_stats.ap
+            stats = recover_manager.get_potion_stats().ap
         elif potion_type == "BC":
-            stats = recover_manager.potion_stats.bc
+            stats = recover_manager.get_potion_stats().bc
         else:
             raise ValueError(f"[{argv.node_name}] 药水种类参数填写错误,未识别到 ap 或者 bc.")
         
-        # 利用免费恢复按钮，既确认是否在吃药界面，又能确认是否需要免费吃药
-        reco_free = context.run_recognition("FreeRecover",argv.image)
-        if not reco_free or not reco_free.hit:
-            msg = f"[{argv.node_name}] 不在恢复界面"
-            return CustomRecognition.AnalyzeResult(box=None, detail=msg)
-        
-        # 判断是否使用免费恢复
-        best_free = getattr(reco_free,"best_result",None)
-        if best_free and recover_manager.potion_stats.use_free_recover:
-            score = float(getattr(best_free,"score",""))
-            if score > self.free_available_threshold:
-                click_roi = self.click_rois["free"]
-                msg = f"使用免费恢复"
-                next_node = "顺利完成吃药"
-                common_func.dynamic_set_focus(context,target_node="输出恢复反馈",trigger="RECO_OK",focus_msg=msg)
-                common_func.dynamic_set_next(context,pre_node="输出恢复反馈",next_node=next_node)
-                logging.info(msg)
-                return CustomRecognition.AnalyzeResult(box=click_roi, detail=msg)
-            
-        # OCR 获取当前药水库存
-        try:
-            big_stock = common_func.extract_number_from_ocr(context,argv.image,task_name="BigPotion")
-            small_stock = common_func.extract_number_from_ocr(context,argv.image,task_name="SmallPotion")
-        except ValueError as e:
-            msg = f"[{argv.node_name}] {e}"
-            return CustomRecognition.AnalyzeResult(box=None, detail=msg)
-        
-        # 储存 ocr 数字
-        stats.big.stock = big_stock
-        stats.small.stock = small_stock
+        manager = recover_manager.get_potion_stats()
+
+        # 今天的免费恢复已经用掉时，跳过免费恢复按钮的识别。
+        # 能走到这个节点说明上一个节点已经确认了恢复界面，不再额外确认。
+        check_free = not (manager.use_free_recover and manager.is_free_used(potion_type))
+        # 库存跟踪模式下，只有账本需要核对时才读画面，其余时间直接用账本
+        check_stock = not manager.track_stock or stats.needs_stock_check(manager.stock_verify_interval)
+
+        # 免费恢复按钮与库存数字互不依赖，同时识别；免费恢复按钮未命中时库存结果直接丢弃
+        calls = []
+        if check_free:
+            calls.append(lambda: context.run_recognition("FreeRecover",argv.image))
+        if check_stock:
+            # 大小药一次 OCR
+            calls.append(lambda: self.read_stocks(context,argv.image))
+        futures = common_func.run_concurrently(calls, gates=[0] if check_free else [])
+        stock_future = futures[-1] if check_stock else None
+
+        if check_free:
+            # 利用免费恢复按钮，既确认是否在吃药界面，又能确认是否需要免费吃药
+            reco_free = futures[0].result()
+            if not reco_free or not reco_free.hit:
+                msg = f"[{argv.node_name}] 不在恢复界面"
+                return CustomRecognition.AnalyzeResult(box=None, detail=msg)
+
+            # 判断是否使用免费恢复
+            best_free = getattr(reco_free,"best_result",None)
+            if best_free and manager.use_free_recover:
+                score = float(getattr(best_free,"score",""))
+                if score > self.free_available_threshold:
+                    # 记下今天已用，之后的恢复不再检查免费恢复
+                    manager.mark_free_used(potion_type)
+                    click_roi = self.click_rois["free"]
+                    msg = f"使用免费恢复"
+                    next_node = "顺利完成吃药"
+                    with common_func.override_batch(context):
+                        common_func.dynamic_set_focus(context,target_node="输出恢复反馈",trigger="RECO_OK",focus_msg=msg)
+                        common_func.dynamic_set_next(context,pre_node="输出恢复反馈",next_node=next_node)
+                    logging.info(msg)
+                    return CustomRecognition.AnalyzeResult(box=click_roi, detail=msg)
+
+        # 获取当前药水库存
+        if check_stock:
+            try:
+                stocks = stock_future.result()
+            except ValueError as e:
+                msg = f"[{argv.node_name}] {e}"
+                return CustomRecognition.AnalyzeResult(box=None, detail=msg)
+
+            if not manager.track_stock:
+                # 不跟踪库存时与以前一样，直接使用读数
+                stats.big.store("stock", stocks["big"])
+                stats.small.store("stock", stocks["small"])
+            else:
+                for potion, reading in ((stats.big, stocks["big"]), (stats.small, stocks["small"])):
+                    if not potion.accept_stock_reading(reading):
+                        logging.warning(
+                            f"[{argv.node_name}] {potion.name} 读到库存 {reading}，多于账本 {potion.stock}，"
+                            f"疑似误识别，暂用账本数据"
+                        )
 
         if stats.big.should_use(): # 大药可用
             # 设定点击位置
             click_roi = self.click_rois["big"]
             # 修改相应数量
-            stats.big.usage += 1
-            stats.big.stock -= 1
+            stats.big.record_use()
             # 构造反馈信息
             msg = stats.big.usage_report()
             # 设定后续节点
             next_node = "顺利完成吃药"
         elif stats.small.should_use(): # 小药可用
             click_roi = self.click_rois["small"]
-            stats.small.usage += 1
-            stats.small.stock -= 1
+            stats.small.record_use()
             msg = stats.small.usage_report()
             next_node = "顺利完成吃药"
         elif potion_type == "AP": 
@@ -111,11 +146,20 @@ class ShouldUsePotion(CustomRecognition):
             msg = f"战斗力恢复药使用达到目标数量或库存不足,将放弃战斗继续跑图"
             next_node = "BC药水不可用"
 
-        # 统一设定输出内容和后续走向
-        common_func.dynamic_set_focus(context,target_node="输出恢复反馈",trigger="RECO_OK",focus_msg=msg)
-        common_func.dynamic_set_next(context,pre_node="输出恢复反馈",next_node=next_node)
+        # 统一设定输出内容和后续走向(合并成一次覆盖下发)
+        with common_func.override_batch(context):
+            common_func.dynamic_set_focus(context,target_node="输出恢复反馈",trigger="RECO_OK",focus_msg=msg)
+            common_func.dynamic_set_next(context,pre_node="输出恢复反馈",next_node=next_node)
         logging.info(msg)
         return CustomRecognition.AnalyzeResult(box=click_roi, detail=msg)
-        
 
-        
+    @classmethod
+    def read_stocks(cls, context: Context, image) -> dict:
+        """OCR 读取大小药库存，各自的区域以 pipeline 中 BigPotion/SmallPotion 节点的 roi 为准"""
+        field_rois = {}
+        for name, node in cls.stock_nodes.items():
+            roi = ocr_cache.node_roi(context, node)
+            if roi is None:
+                raise ValueError(f"{node} 节点没有固定的 roi")
+            field_rois[name] = roi
+        return common_func.extract_numbers_from_ocr(context, image, "PotionStock", field_rois)
@@ -0,0 +1,362 @@
+# input: 一组 socket_id(命令行参数，或运行中通过本地控制端口增删)
+# output: 为每个 socket_id 启动一个 main.py agent 进程，崩溃后自动重启，并汇总各进程的耗时统计
+# pos: 多开守护入口。一台机器跑多个游戏窗口时，代替手动逐个启动/看护 agent
+#
+# 用法:
+#   python agent/supervisor.py <socket_id> [<socket_id> ...]
+#   python agent/supervisor.py --control-port 47800 [<socket_id> ...]
+#
+# 控制端口只监听 127.0.0.1，一行一条命令，每条命令返回一行 JSON:
+#   add <socket_id>      启动一个新的 agent
+#   remove <socket_id>   停止并移除 agent
+#   status               查看每个 agent 的进程号、绑定的 CPU、重启次数
+#   metrics              汇总全部 agent 的耗时统计
+#   shutdown             停止全部 agent 并退出
+#
+# 共享的持久化文件: 战斗档案(SQLite)依靠 SQLite 自身的文件锁串行写入，
+# 免费恢复记录等 JSON 文件通过 utils.file_lock 加锁后读改写，多个进程不会互相覆盖。
+
+import argparse
+import json
+import logging
+import os
+import re
+import signal
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# 将脚本所在目录添加到模块搜索路径，确保能找到同目录下的模块
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
+
+from utils import file_lock
+from utils import perf_monitor
+
+MAIN_SCRIPT = os.path.join(script_dir, "main.py")
+# 各 agent 的统计快照，放在运行目录下的 data 文件夹
+METRICS_DIR = os.path.join("data", "metrics")
+
+# 重启等待：从 BACKOFF_BASE 秒开始，连续崩溃时翻倍，最多 BACKOFF_MAX 秒
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# 运行超过这么久才退出，视为正常运行过，重启等待恢复到 BACKOFF_BASE
+STABLE_SECONDS = 60.0
+# 检查子进程状态的间隔(秒)
+POLL_INTERVAL = 0.5
+# 停止子进程时等待其自行退出的时间(秒)，超时后强制结束
+STOP_TIMEOUT = 10.0
+
+# 停止 agent 用的信号。Windows 上 terminate() 会直接结束进程，agent 来不及收尾，
+# 所以把 agent 放进单独的进程组，用 CTRL_BREAK_EVENT 通知它退出(main.py 中对应 SIGBREAK)
+if os.name == "nt":
+    _STOP_SIGNAL = signal.CTRL_BREAK_EVENT
+    _POPEN_OPTIONS = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    _STOP_SIGNAL = signal.SIGTERM
+    _POPEN_OPTIONS = {}
+
+# Windows 设置进程 CPU 亲和性需要的权限
+_PROCESS_SET_INFORMATION = 0x0200
+_PROCESS_QUERY_INFORMATION = 0x0400
+
+
+def set_affinity(pid: int, cpus: List[int]) -> bool:
+    """把进程绑定到指定 CPU，系统不支持或设置失败时返回 False"""
+    if not cpus:
+        return False
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, set(cpus))
+            return True
+        if os.name == "nt":
+            import ctypes
+
+            kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+            kernel32.OpenProcess.restype = ctypes.c_void_p
+            handle = kernel32.OpenProcess(_PROCESS_SET_INFORMATION | _PROCESS_QUERY_INFORMATION, False, pid)
+            if not handle:
+                return False
+            try:
+                mask = sum(1 << cpu for cpu in cpus)
+                return bool(kernel32.SetProcessAffinityMask(ctypes.c_void_p(handle), ctypes.c_size_t(mask)))
+            finally:
+                kernel32.CloseHandle(ctypes.c_void_p(handle))
+    except OSError as e:
+        logging.warning(f"[Supervisor] 设置进程 {pid} 的 CPU 亲和性失败: {e}")
+    return False
+
+
+def parse_cpus(text: str) -> List[int]:
+    """解析 "0,2,4-7" 形式的 CPU 列表"""
+    cpus = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            low, high = part.split("-", 1)
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+@dataclass
+class AgentProcess:
+    # 一个 socket_id 对应的 agent 进程及其重启状态
+    socket_id: str
+    slot: int                # 分配 CPU 用的序号
+    cpus: List[int]
+    metrics_path: str
+    process: Optional[subprocess.Popen] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    backoff: float = BACKOFF_BASE
+    next_start: float = 0.0
+    last_exit: Optional[int] = None
+    exit_history: List[int] = field(default_factory=list)
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+
+class Supervisor:
+    """启动、看护并汇总多个 agent 进程"""
+
+    def __init__(self, cpus: List[int], metrics_dir: str = METRICS_DIR, metrics_interval: float = 30.0):
+        self.cpus = cpus
+        self.metrics_dir = metrics_dir
+        self.metrics_interval = metrics_interval
+        self.agents: Dict[str, AgentProcess] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    # --- 增删 ---
+    def add(self, socket_id: str) -> bool:
+        with self._lock:
+            if socket_id in self.agents:
+                return False
+            used = {agent.slot for agent in self.agents.values()}
+            slot = next(index for index in range(len(used) + 1) if index not in used)
+            cpus = [self.cpus[slot % len(self.cpus)]] if self.cpus else []
+            safe_name = re.sub(r"[^\w.-]", "_", socket_id)
+            agent = AgentProcess(
+                socket_id=socket_id,
+                slot=slot,
+                cpus=cpus,
+                metrics_path=os.path.join(self.metrics_dir, f"agent-{safe_name}.json"),
+            )
+            self.agents[socket_id] = agent
+            self._start(agent)
+            return True
+
+    def remove(self, socket_id: str) -> bool:
+        with self._lock:
+            agent = self.agents.pop(socket_id, None)
+        if agent is None:
+            return False
+        self._stop(agent)
+        return True
+
+    # --- 进程管理 ---
+    def _start(self, agent: AgentProcess):
+        env = dict(os.environ)
+        env[perf_monitor.SNAPSHOT_PATH_ENV] = agent.metrics_path
+        env[perf_monitor.SNAPSHOT_INTERVAL_ENV] = str(self.metrics_interval)
+        try:
+            agent.process = subprocess.Popen([sys.executable, MAIN_SCRIPT, agent.socket_id], env=env, **_POPEN_OPTIONS)
+        except OSError as e:
+            logging.error(f"[Supervisor] 启动 agent {agent.socket_id} 失败: {e}")
+            agent.process = None
+            self._schedule_restart(agent, crashed=True)
+            return
+        agent.started_at = time.monotonic()
+        bound = set_affinity(agent.process.pid, agent.cpus)
+        cpu_desc = f"，绑定 CPU {agent.cpus}" if bound else ""
+        logging.info(f"[Supervisor] 已启动 agent {agent.socket_id} (pid {agent.process.pid}{cpu_desc})")
+
+    def _stop(self, agent: AgentProcess):
+        process = agent.process
+        if process is None or process.poll() is not None:
+            return
+        # 发送可捕获的停止信号，让 agent 写完战斗档案和统计快照再退出
+        process.send_signal(_STOP_SIGNAL)
+        try:
+            process.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logging.warning(f"[Supervisor] agent {agent.socket_id} 未在 {STOP_TIMEOUT} 秒内退出，强制结束")
+            process.kill()
+            process.wait()
+        logging.info(f"[Supervisor] 已停止 agent {agent.socket_id}")
+
+    def _schedule_restart(self, agent: AgentProcess, crashed: bool):
+        now = time.monotonic()
+        if not crashed or now - agent.started_at >= STABLE_SECONDS:
+            # 正常退出(客户端断开)或稳定运行过一段时间，按最短等待重启
+            agent.backoff = BACKOFF_BASE
+        delay = agent.backoff
+        if crashed:
+            agent.backoff = min(agent.backoff * 2, BACKOFF_MAX)
+        agent.next_start = now + delay
+        agent.restarts += 1
+        logging.warning(
+            f"[Supervisor] agent {agent.socket_id} 已退出(返回码 {agent.last_exit})，{delay:.0f} 秒后第 {agent.restarts} 次重启"
+        )
+
+    def poll(self):
+        """检查所有 agent，退出的安排重启，等待时间到了的重新启动"""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            now = time.monotonic()
+            for agent in self.agents.values():
+                if agent.process is not None and agent.process.poll() is not None:
+                    agent.last_exit = agent.process.returncode
+                    agent.exit_history = (agent.exit_history + [agent.last_exit])[-10:]
+                    agent.process = None
+                    self._schedule_restart(agent, crashed=agent.last_exit != 0)
+                elif agent.process is None and now >= agent.next_start:
+                    self._start(agent)
+
+    def request_stop(self):
+        """只做标记，run() 的循环随后退出，由调用 run() 的地方执行 shutdown()。可在信号处理函数中调用"""
+        self._stopping.set()
+
+    def shutdown(self):
+        self._stopping.set()
+        with self._lock:
+            agents = list(self.agents.values())
+        for agent in agents:
+            self._stop(agent)
+
+    # --- 状态与统计 ---
+    def status(self) -> List[dict]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "socket_id": agent.socket_id,
+                    "pid": agent.process.pid if agent.running else None,
+                    "cpus": agent.cpus,
+                    "uptime": round(now - agent.started_at, 1) if agent.running else 0,
+                    "restarts": agent.restarts,
+                    "last_exit": agent.last_exit,
+                    "restart_in": round(max(agent.next_start - now, 0), 1) if not agent.running else 0,
+                }
+                for agent in self.agents.values()
+            ]
+
+    def metrics(self) -> dict:
+        """读取各 agent 写出的快照并合并，百分位按合并后的直方图计算"""
+        with self._lock:
+            paths = {agent.socket_id: agent.metrics_path for agent in self.agents.values()}
+        snapshots = []
+        for path in paths.values():
+            data = file_lock.read_json(path)
+            if isinstance(data, dict):
+                snapshots.append(data)
+        merged, counters = perf_monitor.merge_snapshots(snapshots)
+        return {
+            "agents": len(paths),
+            "reporting": len(snapshots),
+            "counters": counters,
+            "report": perf_monitor.format_report(merged, counters),
+        }
+
+    def run(self, report_interval: float = 300.0):
+        """主循环，直到 shutdown"""
+        next_report = time.monotonic() + report_interval
+        while not self._stopping.is_set():
+            self.poll()
+            if report_interval > 0 and time.monotonic() >= next_report:
+                next_report = time.monotonic() + report_interval
+                metrics = self.metrics()
+                logging.info(f"[Supervisor] {metrics['reporting']}/{metrics['agents']} 个 agent 的汇总统计:\n{metrics['report']}")
+            self._stopping.wait(POLL_INTERVAL)
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """控制端口的一次连接，可以连续发送多条命令"""
+
+    def handle(self):
+        supervisor: Supervisor = self.server.supervisor
+        for raw in self.rfile:
+            parts = raw.decode("utf-8", errors="replace").split()
+            if not parts:
+                continue
+            command, args = parts[0].lower(), parts[1:]
+            if command == "add" and len(args) == 1:
+                reply = {"ok": supervisor.add(args[0])}
+            elif command == "remove" and len(args) == 1:
+                reply = {"ok": supervisor.remove(args[0])}
+            elif command == "status":
+                reply = {"ok": True, "agents": supervisor.status()}
+            elif command == "metrics":
+                reply = {"ok": True, **supervisor.metrics()}
+            elif command == "shutdown":
+                reply = {"ok": True}
+                supervisor.request_stop()
+            else:
+                reply = {"ok": False, "error": f"未知命令: {' '.join(parts)}"}
+            self.wfile.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int, supervisor: Supervisor):
+        super().__init__(("127.0.0.1", port), ControlHandler)
+        self.supervisor = supervisor
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="启动并看护多个 agent 进程")
+    parser.add_argument("socket_ids", nargs="*", help="每个 socket_id 启动一个 agent")
+    parser.add_argument("--control-port", type=int, default=None, help="本地控制端口，用于运行中增删 agent")
+    parser.add_argument("--cpus", type=parse_cpus, default=None, help="可用的 CPU，例如 0-3 或 0,2,4；按顺序轮流分配给各 agent")
+    parser.add_argument("--metrics-interval", type=float, default=30.0, help="agent 写统计快照的间隔(秒)")
+    parser.add_argument("--report-interval", type=float, default=300.0, help="输出汇总统计的间隔(秒)，0 为不输出")
+    args = parser.parse_args()
+
+    if not args.socket_ids and args.control_port is None:
+        parser.error("至少需要一个 socket_id，或者用 --control-port 之后再添加")
+
+    cpus = args.cpus if args.cpus is not None else list(range(os.cpu_count() or 1))
+    supervisor = Supervisor(cpus=cpus, metrics_interval=args.metrics_interval)
+
+    control = None
+    if args.control_port is not None:
+        control = ControlServer(args.control_port, supervisor)
+        threading.Thread(target=control.serve_forever, name="SupervisorControl", daemon=True).start()
+        logging.info(f"[Supervisor] 控制端口已监听 127.0.0.1:{control.server_address[1]}")
+
+    # 信号处理函数在主线程上执行，主线程此时可能正持有 poll() 里的锁，
+    # 所以这里只做标记，真正的停止在 run() 返回后的 finally 中进行
+    for name in ("SIGTERM", "SIGINT", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda *_: supervisor.request_stop())
+
+    for socket_id in args.socket_ids:
+        supervisor.add(socket_id)
+
+    try:
+        supervisor.run(args.report_interval)
+        logging.info("[Supervisor] 停止全部 agent")
+    finally:
+        supervisor.shutdown()
+        if control is not None:
+            control.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# input: 各 manager 中会被自定义节点修改的 dataclass 实例
+# output: 为 recover_manager、battle_manager、boss_manager、arena_helper 提供原子加减、比较交换和快照读
+# pos: 并发层。MaaFramework 可能在不同线程回调 agent，共享计数器的 读-改-写 需要串行
+
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict
+import threading
+
+# 分片锁数量。锁不放在对象里，dataclass 的字段、asdict、比较都不受影响
+_STRIPES = 64
+_locks = [threading.RLock() for _ in range(_STRIPES)]
+
+
+def lock_of(obj) -> threading.RLock:
+    """取出 obj 对应的分片锁。不同对象可能共用一把锁，所以是可重入锁"""
+    # 对象地址低位基本是对齐用的 0，先右移再取模，分布更均匀
+    return _locks[(id(obj) >> 4) % _STRIPES]
+
+
+class AtomicFields:
+    """
+    混入到 manager 的 dataclass 中，提供按对象加锁的原子操作:
+        stats.incr("current_battles")               加一并返回新值
+        stats.compare_and_set("stock", 5, 4)        当前值等于 5 时才改成 4
+        stats.snapshot("usage", "stock")            一次性读出多个字段
+        with stats.locked(): ...                    同时修改多个字段
+    多个字段要一起改时用 locked()；不要在 locked() 里再去锁另一个对象，避免交叉加锁。
+    """
+
+    __slots__ = ()
+
+    def locked(self) -> threading.RLock:
+        return lock_of(self)
+
+    def incr(self, name: str, delta: int = 1) -> int:
+        """字段加 delta，返回修改后的值"""
+        with lock_of(self):
+            value = getattr(self, name) + delta
+            setattr(self, name, value)
+            return value
+
+    def compare_and_set(self, name: str, expected: Any, value: Any) -> bool:
+        """字段当前值等于 expected 时改为 value，返回是否修改成功"""
+        with lock_of(self):
+            if getattr(self, name) != expected:
+                return False
+            setattr(self, name, value)
+            return True
+
+    def store(self, name: str, value: Any):
+        """加锁写入，保证不会插在别的线程的 读-改-写 中间"""
+        with lock_of(self):
+            setattr(self, name, value)
+
+    def snapshot(self, *names: str) -> Dict[str, Any]:
+        """一次性读出多个字段(不传则为全部 dataclass 字段)，读到的值彼此一致"""
+        if not names and is_dataclass(self):
+            names = tuple(f.name for f in fields(self))
+        with lock_of(self):
+            return {name: getattr(self, name) for name in names}
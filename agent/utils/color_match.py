@@ -0,0 +1,101 @@
+# input: 自定义识别的截图，pipeline 中 ColorMatch 节点的 lower/upper/count
+# output: 为 lab_reco 等提供"一次遍历判断多个 ROI 颜色"的能力
+# pos: ColorMatch 的 numpy 向量化实现，多个 ROI 只截取/比较一次画面
+
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from maa.context import Context
+
+# MaaFramework ColorMatch 的默认 method：截图(BGR)转 RGB 后比较
+METHOD_RGB = 4
+
+
+def _normalize_bounds(lower, upper) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把 lower/upper 统一成 (K, 3) 的数组。
+    pipeline 里两种写法都有：[[194,244,241]] 与 [0,224,245]，
+    只有一边是嵌套列表时，另一边广播给每个范围。
+    """
+    low = np.atleast_2d(np.asarray(lower, dtype=np.int16))
+    up = np.atleast_2d(np.asarray(upper, dtype=np.int16))
+    if low.shape[-1] != 3 or up.shape[-1] != 3:
+        raise ValueError(f"ColorMatch 上下限必须是 3 通道: lower={lower}, upper={upper}")
+    if len(low) != len(up):
+        if len(low) == 1:
+            low = np.repeat(low, len(up), axis=0)
+        elif len(up) == 1:
+            up = np.repeat(up, len(low), axis=0)
+        else:
+            raise ValueError(f"ColorMatch 上下限数量不一致: lower={lower}, upper={upper}")
+    return low, up
+
+
+def match_counts(image: np.ndarray, rois: Sequence[List[int]], lower, upper) -> np.ndarray:
+    """
+    返回每个 ROI 中落在颜色范围内的像素数。
+
+    只在所有 ROI 的外接矩形上做一次颜色比较，再用积分图一次性求出每个 ROI 的像素数，
+    与逐个 ROI 调用 ColorMatch 的结果一致(method=RGB，不要求连通)。
+    """
+    if not rois:
+        return np.zeros(0, dtype=np.int64)
+    height, width = image.shape[:2]
+    boxes = np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+    x1 = np.clip(boxes[:, 0], 0, width)
+    y1 = np.clip(boxes[:, 1], 0, height)
+    x2 = np.clip(boxes[:, 0] + boxes[:, 2], 0, width)
+    y2 = np.clip(boxes[:, 1] + boxes[:, 3], 0, height)
+
+    # 外接矩形
+    left, top, right, bottom = x1.min(), y1.min(), x2.max(), y2.max()
+    # 截图是 BGR，ColorMatch 默认按 RGB 比较
+    region = image[top:bottom, left:right, 2::-1].astype(np.int16)
+
+    low, up = _normalize_bounds(lower, upper)
+    # (H, W, 1, 3) 与 (K, 3) 广播，任意一个范围命中即算命中
+    pixels = region[:, :, np.newaxis, :]
+    mask = ((pixels >= low) & (pixels <= up)).all(axis=3).any(axis=2)
+
+    # 积分图多补一行一列 0，方便按坐标直接相减
+    integral = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    integral[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+    x1, x2, y1, y2 = x1 - left, x2 - left, y1 - top, y2 - top
+    return integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+
+
+def match_bitmap(image: np.ndarray, rois: Sequence[List[int]], lower, upper, count: int = 1) -> np.ndarray:
+    """返回每个 ROI 是否命中(命中像素数 >= count)的布尔数组，顺序与 rois 一致"""
+    return match_counts(image, rois, lower, upper) >= count
+
+
+def to_bits(states: Sequence[bool]) -> int:
+    """把布尔数组压成整数位图，第 i 个 ROI 对应第 i 位"""
+    return sum(1 << i for i, state in enumerate(states) if state)
+
+
+def node_bounds(context: Context, node_name: str) -> Dict:
+    """
+    从 pipeline 中读取 ColorMatch 节点的颜色参数，颜色范围仍以 pipeline 为准。
+    返回 {"lower": ..., "upper": ..., "count": ...}
+    """
+    data = context.get_node_data(node_name)
+    if not data:
+        raise ValueError(f"未找到 ColorMatch 节点: {node_name}")
+    recognition = data.get("recognition", {})
+    if recognition.get("type") != "ColorMatch":
+        raise ValueError(f"节点 {node_name} 不是 ColorMatch 识别: {recognition.get('type')}")
+    param = recognition.get("param", {})
+    method = param.get("method", METHOD_RGB)
+    if method != METHOD_RGB:
+        raise ValueError(f"节点 {node_name} 使用了 method={method}，目前只支持 RGB(4)")
+    return {
+        "lower": param["lower"],
+        "upper": param["upper"],
+        "count": int(param.get("count", 1)),
+    }
+
+
+def match_node_bitmap(context: Context, image: np.ndarray, node_name: str, rois: Sequence[List[int]]) -> np.ndarray:
+    """用 pipeline 中 node_name 的颜色参数，一次判断 rois 中每个 ROI 是否命中"""
+    bounds = node_bounds(context, node_name)
+    return match_bitmap(image, rois, bounds["lower"], bounds["upper"], bounds["count"])
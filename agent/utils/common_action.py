@@ -2,7 +2,9 @@ from maa.agent.agent_server import AgentServer
 from maa.custom_action import CustomAction
 from maa.context import Context
 import logging
+import time
 from . import common_func
+from . import perf_monitor
 
 @AgentServer.custom_action("set_next")
 class SetNext(CustomAction):
@@ -48,6 +50,61 @@ class ClickAllCustomReco(CustomAction):
         logging.info(f"[{argv.node_name}] 开始执行点击，共 {len(click_targets)} 个目标。")
         # 从字典列表中提取 ROI 列表
         roi_list = [target["roi"] for target in click_targets]
-        common_func.group_click(context, roi_list)
+        click_options = common_func.parse_click_options(argv.custom_action_param, argv.node_name)
+        common_func.group_click(context, roi_list, **click_options)
 
-        return CustomAction.RunResult(success=True)
\ No newline at end of file
+        return CustomAction.RunResult(success=True)
+
+@AgentServer.custom_action("dump_perf_stats")
+class DumpPerfStats(CustomAction):
+    """
+    输出各自定义节点的耗时分布(p50/p95/p99)。
+    custom_action_param 可选 {"reset": true}，输出后清空已记录的数据。
+    """
+    def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
+        perf_monitor.dump_report()
+
+        params = common_func.parse_optional_params(argv.custom_action_param, argv.node_name)
+        if str(params.get("reset", False)).lower() == "true":
+            perf_monitor.reset()
+            logging.info(f"[{argv.node_name}] 已清空耗时统计")
+
+        return CustomAction.RunResult(success=True)
+
+
+@AgentServer.custom_action("wait_until_time")
+class WaitUntilTime(CustomAction):
+    """
+    睡到今天的指定时间前 lead_seconds 秒再继续，代替循环识别等待。
+    参数: {"target_hour": 19, "target_minute": 0, "lead_seconds": 3(可选)}
+    醒来后交给后续节点的识别来精确对准时间；已经过了目标时间时立即返回。
+    """
+    def run(self, context: Context, argv: CustomAction.RunArg) -> CustomAction.RunResult:
+        try:
+            params = common_func.parse_params(
+                param_str=argv.custom_action_param,
+                node_name=argv.node_name,
+                required_keys=["target_hour", "target_minute"]
+            )
+            target_hour = int(params["target_hour"])
+            target_minute = int(params["target_minute"])
+            lead_seconds = max(float(params.get("lead_seconds", 3)), 0.0)
+        except ValueError as e:
+            logging.error(f"[{argv.node_name}] 参数解析失败: {e}")
+            return CustomAction.RunResult(success=False)
+
+        # 墙上时间只在这里换算一次，之后用单调时钟计时，不受系统改时间影响
+        wait_seconds = common_func.seconds_until_target_time(target_hour, target_minute) - lead_seconds
+        if wait_seconds <= 0:
+            return CustomAction.RunResult(success=True)
+
+        time_str = f"{target_hour:02d}:{target_minute:02d}"
+        logging.info(f"[{argv.node_name}] 距离 {time_str} 还有 {wait_seconds + lead_seconds:.0f} 秒，提前 {lead_seconds:.0f} 秒醒来")
+        finished = common_func.sleep_until(
+            time.monotonic() + wait_seconds,
+            should_abort=lambda: context.tasker.stopping,
+        )
+        if not finished:
+            logging.info(f"[{argv.node_name}] 任务已停止，结束等待")
+            return CustomAction.RunResult(success=False)
+        return CustomAction.RunResult(success=True)
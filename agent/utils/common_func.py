@@ -2,12 +2,19 @@
 # output: 各类模块
 # pos: 为各个模块提供通用工具。
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Callable, Dict, Hashable, List, Any, Optional, Sequence, Tuple
+import copy
 import json
 import logging
+import threading
+import time
 from maa.context import Context
 import random
+from . import ocr_cache
+from . import session
 
 def is_after_target_time(target_hour:int,target_minute:int) -> bool:
     """
@@ -36,6 +43,31 @@ def is_after_target_time(target_hour:int,target_minute:int) -> bool:
     # 如果 now 在时间轴上位于 target_time 之后，结果就是 True
     return now >= target_time
 
+def seconds_until_target_time(target_hour: int, target_minute: int) -> float:
+    """
+    距离今天指定时间还有多少秒，已经过了则返回 0。
+    """
+    now = datetime.now()
+    target_time = now.replace(hour=target_hour, minute=target_minute, second=0, microsecond=0)
+    return max((target_time - now).total_seconds(), 0.0)
+
+def sleep_until(deadline: float, should_abort: Callable[[], bool] = None, slice_seconds: float = 5.0) -> bool:
+    """
+    阻塞到单调时钟 time.monotonic() 到达 deadline。
+    分段睡眠，每段醒来检查一次 should_abort，方便用户中途停止任务。
+    睡眠期间不截图、不识别，几乎不占 CPU。
+
+    Returns:
+        bool: 正常睡到 deadline 返回 True，被中止返回 False
+    """
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        if should_abort is not None and should_abort():
+            return False
+        time.sleep(min(remaining, slice_seconds))
+
 def parse_params(param_str:str,node_name:str,required_keys:List[str]=None)->Dict[str,Any]:
     """
     解析节点参数，确定所需参数都在,并将正确格式返回。
@@ -78,6 +110,126 @@ def parse_params(param_str:str,node_name:str,required_keys:List[str]=None)->Dict
         raise ValueError(error_msg)
     return params
 
+def parse_optional_params(param_str: str, node_name: str) -> Dict[str, Any]:
+    """
+    解析可选的节点参数。没有填写参数时返回空字典，而不是像 parse_params 一样报错。
+    """
+    # 节点没填参数时框架可能传入空字符串或 "null"
+    if not param_str or param_str == "null":
+        return {}
+    params = parse_params(param_str, node_name)
+    if not isinstance(params, dict):
+        raise ValueError(f"参数必须是 JSON 对象。收到: {param_str}")
+    return params
+
+def deep_merge(base: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把 patch 递归合并进 base（原地修改并返回 base）。
+    字典逐层合并，其余类型（包括 next 这样的列表）直接整体覆盖，与 override_pipeline 的语义一致。
+    """
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            deep_merge(base[key], value)
+        else:
+            base[key] = copy.deepcopy(value)
+    return base
+
+
+class OverrideBatch:
+    """一批待下发的 pipeline 覆盖，退出 override_batch 时合并成一次 override_pipeline 调用"""
+    def __init__(self, context: Context):
+        self.context = context
+        self.pending: Dict[str, Any] = {}
+
+    def add(self, pipeline_override: Dict[str, Any]):
+        deep_merge(self.pending, pipeline_override)
+
+    def flush(self) -> bool:
+        if not self.pending:
+            return True
+        pending, self.pending = self.pending, {}
+        return _send_override(self.context, pending)
+
+
+# 已下发覆盖的影子副本：会话 -> 节点名 -> {字段名: 最近一次下发的值}
+# 每个 tasker 的覆盖互不相关，按会话分开记录，避免一个窗口的覆盖让另一个窗口误以为已经下发过
+# 覆盖只在当前任务内有效，任务开始/结束时由 common_sink 调用 invalidate_override_shadow 清空
+_override_shadow: Dict[Hashable, Dict[str, Dict[str, Any]]] = {}
+_shadow_lock = threading.Lock()
+# sent: 实际调用 override_pipeline 的次数; skipped: 与影子完全相同而被跳过的次数
+override_counters = {"sent": 0, "skipped": 0}
+
+def invalidate_override_shadow():
+    """清空影子副本，之后的覆盖都会重新下发"""
+    with _shadow_lock:
+        _override_shadow.clear()
+
+def _send_override(context: Context, pipeline_override: Dict[str, Any]) -> bool:
+    """去掉与影子副本完全相同的字段后再下发，全部相同则直接跳过"""
+    with _shadow_lock:
+        shadow = _override_shadow.setdefault(session.of(context).key, {})
+        pending = {}
+        for node, fields in pipeline_override.items():
+            applied = shadow.get(node, {})
+            changed = {key: value for key, value in fields.items() if key not in applied or applied[key] != value}
+            if changed:
+                pending[node] = changed
+
+        if not pending:
+            override_counters["skipped"] += 1
+            return True
+
+        success = context.override_pipeline(pending)
+        if success:
+            override_counters["sent"] += 1
+            # 影子按字段整体替换记录，只有完全相同的值才会被跳过，不会漏发
+            for node, fields in pending.items():
+                shadow.setdefault(node, {}).update(copy.deepcopy(fields))
+        return success
+
+
+# 每个线程当前正在收集的覆盖批次
+_batch_local = threading.local()
+
+@contextmanager
+def override_batch(context: Context):
+    """
+    在 with 块内，所有经过 apply_override 的覆盖（包括 dynamic_set_next / dynamic_set_focus）
+    都会先攒起来，退出 with 块时合并成一次 override_pipeline 下发。
+    每次 override_pipeline 都要跨进程传给 MaaFramework，合并后可以省掉多余的往返。
+
+    举例:
+    with common_func.override_batch(context):
+        common_func.dynamic_set_focus(context, "输出战斗信息", "RECO_OK", msg)
+        common_func.dynamic_set_next(context, "放生广播分流", "放生结束")
+    """
+    current = getattr(_batch_local, "batch", None)
+    if current is not None and current.context is context:
+        # 嵌套使用时并入外层批次，由外层统一下发
+        yield current
+        return
+
+    batch = OverrideBatch(context)
+    _batch_local.batch = batch
+    try:
+        yield batch
+    finally:
+        # 即使中途出错也把已经攒下的覆盖发出去，行为与逐条下发时保持一致
+        _batch_local.batch = current
+        batch.flush()
+
+def apply_override(context: Context, pipeline_override: Dict[str, Any]) -> bool:
+    """
+    pipeline 覆盖的统一出口。
+    处于 override_batch 中时只合并进批次，否则立即下发。
+    与上次下发值相同的字段会被跳过（例如每次遭遇都把 放生分流 的 next 改成同一个值）。
+    """
+    batch = getattr(_batch_local, "batch", None)
+    if batch is not None and batch.context is context:
+        batch.add(pipeline_override)
+        return True
+    return _send_override(context, pipeline_override)
+
 def dynamic_set_next(context: Context, pre_node: str, next_node: str):
     """
     通用函数：修改指定节点的 next 指向
@@ -86,7 +238,7 @@ def dynamic_set_next(context: Context, pre_node: str, next_node: str):
     :param next_node: 目标节点名
     """
     # 这里不做过多的参数校验（如是否为空），保持函数的纯粹性。   
-    context.override_pipeline({
+    apply_override(context, {
         pre_node: {
             "next": [next_node]
         }
@@ -123,7 +275,7 @@ def dynamic_set_focus(context: Context, target_node: str, trigger: str, focus_ms
     logging.info(f"[SetFocus] 配置: {target_node} -> [{final_trigger}] -> Focus={focus_msg}")
 
     # 将指定节点的 focus 改写
-    context.override_pipeline({
+    apply_override(context, {
         target_node:{
             "focus":{final_trigger:focus_msg}
         }
@@ -143,18 +295,17 @@ def extract_number_from_ocr(context: Context, image, task_name: str) -> int:
         int: 提取到的数字
         None: 如果没识别到、没文字、或文字里没有数字，则返回 None
     """
-    # 执行 ocr 节点
-    reco_detail = context.run_recognition(task_name,image)
+    # 执行 ocr 节点(ROI 内像素与之前相同时直接用缓存的结果)
+    reco_detail = ocr_cache.run_recognition(context,task_name,image)
 
     # 校验没有结果或未命中的情况
     if not reco_detail or not reco_detail.hit:
         raise ValueError(f"OCR任务 [{task_name}] 未命中或识别失败")
     
     # 提取区域内所有识别到的结果,并按照横坐标排序拼在一起变成完整提取文本
-    all_blocks = reco_detail.filtered_results
     try:
-        # 排序
-        all_blocks.sort(key=lambda block: block.box[0])
+        # 排序(结果可能来自缓存，排序到新列表，不改动原结果)
+        all_blocks = sorted(reco_detail.filtered_results, key=lambda block: block.box[0])
     except Exception as e:
         # 如果连坐标都读不出来，说明数据结构异常，报错
         logging.error(f"排序 OCR 结果块时发生严重错误: {e}")
@@ -171,39 +322,275 @@ def extract_number_from_ocr(context: Context, image, task_name: str) -> int:
     return int(digits)
 
 
-def group_click(context: Context, roi_collection):
+def _box_overlap(box, roi) -> int:
+    """计算识别框与字段 ROI 的重叠面积"""
+    x, y, w, h = box
+    rx, ry, rw, rh = roi
+    overlap_w = min(x + w, rx + rw) - max(x, rx)
+    overlap_h = min(y + h, ry + rh) - max(y, ry)
+    return max(overlap_w, 0) * max(overlap_h, 0)
+
+
+def extract_numbers_from_ocr(context: Context, image, task_name: str, field_rois: Dict[str, List[int]]) -> Dict[str, int]:
+    """
+    通用工具：一次 OCR 同时读取多个数字字段。
+
+    task_name 对应的 OCR 节点的 roi 需要覆盖所有字段(各字段 ROI 的并集)，
+    识别完成后按文字块的位置把它们分回各个字段，每个字段内按横坐标拼接后提取数字。
+    原本 N 个字段要跑 N 次 OCR，现在只需要一次。
+
+    Args:
+        context: MFW 的上下文对象
+        image: 当前画面的图片数据
+        task_name: pipeline.json 中定义的 OCR 任务名称
+        field_rois: 字段名 -> 该字段的 ROI，例如 {"big": [789,378,94,40], "small": [781,492,95,41]}
+
+    Returns:
+        Dict[str, int]: 字段名 -> 数字，例如 {"big": 12, "small": 40}
+
+    Raises:
+        ValueError: OCR 未命中，或者某个字段中没有识别到数字
+    """
+    reco_detail = ocr_cache.run_recognition(context, task_name, image)
+    if not reco_detail or not reco_detail.hit:
+        raise ValueError(f"OCR任务 [{task_name}] 未命中或识别失败")
+
+    field_blocks = {name: [] for name in field_rois}
+    for block in reco_detail.filtered_results:
+        box = [int(v) for v in block.box]
+        center_x = box[0] + box[2] / 2
+        center_y = box[1] + box[3] / 2
+        # 优先看文字块中心落在哪个字段里，都不在的话归给重叠面积最大的字段
+        target = None
+        for name, (x, y, w, h) in field_rois.items():
+            if x <= center_x <= x + w and y <= center_y <= y + h:
+                target = name
+                break
+        if target is None:
+            overlaps = {name: _box_overlap(box, roi) for name, roi in field_rois.items()}
+            best = max(overlaps, key=overlaps.get)
+            if overlaps[best] > 0:
+                target = best
+        # 和所有字段都不相交的文字块(例如两个字段中间的说明文字)直接丢弃
+        if target is not None:
+            field_blocks[target].append(block)
+
+    numbers = {}
+    for name, blocks in field_blocks.items():
+        blocks.sort(key=lambda block: block.box[0])
+        ocr_text = "".join(b.text for b in blocks)
+        digits = "".join(ch for ch in ocr_text if ch.isdigit())
+        if not digits:
+            raise ValueError(f"OCR任务 [{task_name}] 的字段 {name} 识别到了文本 '{ocr_text}' 但其中不包含数字")
+        numbers[name] = int(digits)
+
+    return numbers
+
+
+def parse_click_options(param_str: str, node_name: str) -> Dict[str, Any]:
+    """
+    从 custom_action_param 中读取 group_click 的点击方式，可直接展开传给 group_click。
+    可选参数: {"pipelined": true, "click_interval": 80}，参数为空时保持逐个等待的串行点击。
+    """
+    params = parse_optional_params(param_str, node_name)
+    options = {}
+    if "pipelined" in params:
+        options["pipelined"] = str(params["pipelined"]).lower() == "true"
+    if "click_interval" in params:
+        options["min_interval_ms"] = int(params["click_interval"])
+    return options
+
+
+def group_click(context: Context, roi_collection, pipelined: bool = False, min_interval_ms: int = 0):
+    """
+    依次点击一组 ROI 或坐标。
+
+    Args:
+        context: MFW 的上下文对象
+        roi_collection: ROI/坐标组成的列表或字典
+        pipelined: False 时每次点击都等待控制器执行完成(严格串行);
+                   True 时连续投递整批点击，只等待最后一个，省掉每次点击的往返等待
+        min_interval_ms: 流水线模式下相邻两次投递之间的最小间隔(毫秒)，防止点得太快游戏没反应
+    """
     # 如果传入的是字典，先转成列表
-        targets_to_click = []
-        if isinstance(roi_collection, dict):
-            targets_to_click = list(roi_collection.values())
-        elif isinstance(roi_collection,list):
-            targets_to_click = roi_collection
+    targets_to_click = []
+    if isinstance(roi_collection, dict):
+        targets_to_click = list(roi_collection.values())
+    elif isinstance(roi_collection,list):
+        targets_to_click = roi_collection
+    else:
+        raise ValueError(f"ROI 清单格式不对，必须为字典或列表,当前收到的内容为: {roi_collection}")
+
+    # 先把所有坐标算好，流水线模式下不会出现点到一半才发现数据写错的情况
+    click_points = []
+    for index, item in enumerate(targets_to_click):
+        target_x, target_y = 0, 0
+
+        # item 可能是列表或元组，这里检查长度
+        # 假设 ROI 是 [x, y, w, h]，坐标是 [x, y]
+        if len(item) == 4:
+            x, y, w, h = item
+            # 在 ROI 范围内进行均匀随机
+            # 虽然游戏本身不检测点击,这里的随机没啥必要,但反正也不麻烦,顺手做一下
+            # 这里使用了 int() 确保坐标是整数
+            target_x = random.randint(int(x), int(x + w))
+            target_y = random.randint(int(y), int(y + h))
+
+        elif len(item) == 2:
+            x, y = item
+            # 如果是坐标，直接使用
+            target_x, target_y = int(x), int(y)
+
         else:
-            raise ValueError(f"ROI 清单格式不对，必须为字典或列表,当前收到的内容为: {roi_collection}")
-        
-        for index, item in enumerate(targets_to_click):
-            target_x, target_y = 0, 0
-            
-            # item 可能是列表或元组，这里检查长度
-            # 假设 ROI 是 [x, y, w, h]，坐标是 [x, y]
-            if len(item) == 4:
-                x, y, w, h = item
-                # 在 ROI 范围内进行均匀随机
-                # 虽然游戏本身不检测点击,这里的随机没啥必要,但反正也不麻烦,顺手做一下
-                # 这里使用了 int() 确保坐标是整数
-                target_x = random.randint(int(x), int(x + w))
-                target_y = random.randint(int(y), int(y + h))
-                
-            elif len(item) == 2:
-                x, y = item
-                # 如果是坐标，直接使用
-                target_x, target_y = int(x), int(y)
-                
-            else:
-                # 快速失败：遇到格式不对的数据直接停下来，方便定位是哪个数据写错了
-                raise ValueError(f"数据格式错误: 第 {index+1} 个数据长度异常 (期望 2 或 4，实际 {len(item)})。内容: {item}")
-            # 执行点击
-            # 传入计算好的 target_x, target_y
-            context.tasker.controller.post_click(target_x, target_y).wait()
-
-        return True
\ No newline at end of file
+            # 快速失败：遇到格式不对的数据直接停下来，方便定位是哪个数据写错了
+            raise ValueError(f"数据格式错误: 第 {index+1} 个数据长度异常 (期望 2 或 4，实际 {len(item)})。内容: {item}")
+        click_points.append((target_x, target_y))
+
+    controller = context.tasker.controller
+    if not pipelined:
+        # 严格串行：每次点击都等控制器执行完成
+        for target_x, target_y in click_points:
+            controller.post_click(target_x, target_y).wait()
+        return True
+
+    # 流水线：控制器按投递顺序执行，所以只需要等待最后一个点击
+    last_job = None
+    for index, (target_x, target_y) in enumerate(click_points):
+        if index > 0 and min_interval_ms > 0:
+            time.sleep(min_interval_ms / 1000)
+        last_job = controller.post_click(target_x, target_y)
+    if last_job is not None:
+        last_job.wait()
+
+    return True
+
+
+# ============================================================================
+# 并发子识别：同一帧上互不依赖的 run_recognition 分发到线程池同时执行
+# ============================================================================
+
+# 子识别线程数。识别在 MaaFramework 的原生代码中执行，线程多了只会互相抢 CPU；设为 1 即全部串行
+SUB_RECOGNITION_WORKERS = 4
+
+_sub_executor: Optional[ThreadPoolExecutor] = None
+_sub_executor_lock = threading.Lock()
+# 标记子识别线程，线程内再发起并发子识别时直接串行执行，避免占满线程池后互相等待
+_sub_worker = threading.local()
+
+
+def _mark_sub_worker():
+    _sub_worker.active = True
+
+
+def _get_sub_executor() -> ThreadPoolExecutor:
+    global _sub_executor
+    if _sub_executor is None:
+        with _sub_executor_lock:
+            if _sub_executor is None:
+                _sub_executor = ThreadPoolExecutor(
+                    max_workers=max(SUB_RECOGNITION_WORKERS, 1),
+                    thread_name_prefix="SubRecognition",
+                    initializer=_mark_sub_worker,
+                )
+    return _sub_executor
+
+
+def _is_recognition_miss(result) -> bool:
+    return not result or not result.hit
+
+
+def _bind_caller(call: Callable[[], Any]) -> Callable[[], Any]:
+    """让 call 在子识别线程里沿用发起线程的会话和计时归属"""
+    # perf_monitor 依赖本模块，只能在这里导入
+    from . import perf_monitor
+
+    bound_session = session.current()
+    perf_key = perf_monitor.current_key()
+
+    def run():
+        with session.bind(bound_session), perf_monitor.attributed(perf_key):
+            return call()
+
+    return run
+
+
+def _run_serial(calls: Sequence[Callable[[], Any]], gates: Sequence[int], is_miss: Callable[[Any], bool]) -> List[Future]:
+    """串行执行：先跑门控，门控未命中时其余的不再执行"""
+    futures = [Future() for _ in calls]
+    order = list(gates) + [index for index in range(len(calls)) if index not in gates]
+    for position, index in enumerate(order):
+        try:
+            futures[index].set_result(calls[index]())
+        except Exception as e:
+            futures[index].set_exception(e)
+        if index in gates and (futures[index].exception() is not None or is_miss(futures[index].result())):
+            for rest in order[position + 1:]:
+                futures[rest].cancel()
+            break
+    return futures
+
+
+def run_concurrently(
+    calls: Sequence[Callable[[], Any]],
+    gates: Sequence[int] = (),
+    is_miss: Callable[[Any], bool] = _is_recognition_miss,
+    max_workers: Optional[int] = None,
+) -> List[Future]:
+    """
+    把一组互不依赖的子识别同时执行，返回与 calls 顺序一致的 Future 列表。
+
+    gates 中的下标是门控识别(例如"是否在某个界面")：按顺序检查，任何一个未命中(is_miss 为真)
+    或抛出异常时，还没开始的调用直接取消，已经开始的等它结束后丢弃结果。
+    调用方用 future.result() 取结果，异常会在取结果时抛出，与串行写法抛出的位置一致；
+    被取消的调用 future.cancelled() 为 True。
+
+    max_workers(默认 SUB_RECOGNITION_WORKERS) <= 1 或者已经在子识别线程里时串行执行(门控优先)，结果形式相同。
+    """
+    gates = list(gates)
+    if max_workers is None:
+        max_workers = SUB_RECOGNITION_WORKERS
+    if max_workers <= 1 or len(calls) <= 1 or getattr(_sub_worker, "active", False):
+        return _run_serial(calls, gates, is_miss)
+
+    executor = _get_sub_executor()
+    # 门控先提交，线程池占满时也能先跑门控
+    order = gates + [index for index in range(len(calls)) if index not in gates]
+    futures: List[Optional[Future]] = [None] * len(calls)
+    for index in order:
+        futures[index] = executor.submit(_bind_caller(calls[index]))
+
+    for gate in gates:
+        future = futures[gate]
+        if future.exception() is None and not is_miss(future.result()):
+            continue
+        # 门控未通过：取消还在排队的调用，等正在执行的结束(之后 context 可能失效，不能留在后台跑)
+        for index in order:
+            futures[index].cancel()
+        break
+
+    for future in futures:
+        if not future.cancelled():
+            future.exception()
+    return futures
+
+
+def run_recognitions(
+    context: Context,
+    image,
+    entries: Sequence[Tuple[str, Optional[Dict[str, Any]]]],
+    gates: Sequence[int] = (),
+    max_workers: Optional[int] = None,
+) -> List[Any]:
+    """
+    在同一帧上同时执行多个 (节点名, pipeline_override) 识别，按顺序返回 RecognitionDetail。
+    gates 中的识别未命中时，其余还没开始的识别被取消，对应位置返回 None。
+
+    举例:
+    page, rank = common_func.run_recognitions(context, argv.image, [("BossPage", None), ("CurrentRank", None)], gates=[0])
+    """
+    calls = [
+        (lambda node=node, override=override: context.run_recognition(node, image, override))
+        for node, override in entries
+    ]
+    futures = run_concurrently(calls, gates, max_workers=max_workers)
+    return [None if future.cancelled() else future.result() for future in futures]
@@ -0,0 +1,25 @@
+# input: MaaFramework 的任务事件
+# output: 通知 common_func、frame_gate、ocr_cache 等模块任务已切换
+# pos: 监听任务开始/结束，清理只在单个任务内有效的缓存
+
+from maa.agent.agent_server import AgentServer
+from maa.tasker import Tasker, TaskerEventSink
+from maa.event_sink import NotificationType
+import logging
+from . import common_func
+from . import frame_gate
+from . import ocr_cache
+
+
+@AgentServer.tasker_sink()
+class TaskLifecycleSink(TaskerEventSink):
+    """任务开始或结束时，清空只在本任务内有效的缓存"""
+    def on_tasker_task(self, tasker: Tasker, noti_type: NotificationType, detail: TaskerEventSink.TaskerTaskDetail):
+        if noti_type == NotificationType.Starting:
+            logging.debug(f"[TaskLifecycle] 任务 {detail.entry}({detail.task_id}) 开始，清空覆盖影子与画面缓存")
+        # pipeline 覆盖随任务结束失效，新任务开始时也要保证影子是空的
+        common_func.invalidate_override_shadow()
+        # 画面缓存只在同一任务内有效，避免跨任务复用旧结果
+        frame_gate.invalidate_all()
+        # OCR 缓存按像素记录，本身不会过期；新任务可能改写 OCR 节点参数，一并清空
+        ocr_cache.invalidate()
@@ -0,0 +1,97 @@
+# input: data 文件夹中多个 agent 进程共用的持久化文件
+# output: 为 recover_manager、perf_monitor 等提供跨进程文件锁和原子写入
+# pos: 一台机器跑多个 agent 进程(见 supervisor)时，保证共享文件不会互相覆盖或写坏
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+import json
+import os
+import time
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# 等待其他进程释放锁的默认时间(秒)
+DEFAULT_TIMEOUT = 10.0
+# 重试加锁的间隔(秒)
+_RETRY_INTERVAL = 0.05
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if os.name == "nt":
+            # 锁住锁文件的第一个字节即可，锁文件本身不写内容
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int):
+    if os.name == "nt":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked(path: str, timeout: float = DEFAULT_TIMEOUT):
+    """
+    对 path 加跨进程排他锁(锁文件为 path + ".lock")，with 块结束时释放。
+    超过 timeout 秒仍拿不到锁时抛出 TimeoutError。
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"等待文件锁超时: {path}")
+            time.sleep(_RETRY_INTERVAL)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data: Any):
+    """先写临时文件再替换，读取方永远不会读到写了一半的文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """读取 JSON 文件，文件不存在或损坏时返回 default"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def update_json(path: str, mutate: Callable[[Dict[str, Any]], None], timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """
+    在文件锁内 读取 -> mutate 原地修改 -> 原子写回，返回写入后的内容。
+    多个进程同时更新同一个文件时不会丢掉彼此的修改。
+    """
+    with locked(path, timeout):
+        data = read_json(path, {})
+        if not isinstance(data, dict):
+            data = {}
+        mutate(data)
+        atomic_write_json(path, data)
+    return data
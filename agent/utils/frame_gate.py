@@ -0,0 +1,180 @@
+# input: 自定义识别的截图与参数
+# output: 为 battle_reco、boss_reco 等提供"画面没变就复用上次结果"的能力
+# pos: 对 ROI 做感知哈希，画面不变时跳过重复识别
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+import functools
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+from maa.custom_recognition import CustomRecognition
+from . import ocr_cache
+from . import session
+
+# 差值哈希的尺寸：缩放到 (HASH_SIZE+1) x HASH_SIZE，得到 HASH_SIZE*HASH_SIZE 位
+HASH_SIZE = 8
+# 默认容忍的汉明距离，吸收截图压缩/抗锯齿带来的细微噪点
+DEFAULT_TOLERANCE = 2
+
+
+def dhash(image: np.ndarray, roi: List[int]) -> int:
+    """
+    计算 roi 区域的差值哈希(dHash)。
+    先按块取平均缩小到 9x8 的灰度图，再比较相邻像素的明暗，得到 64 位整数。
+    dHash 只反映大致的明暗分布，区域里一两个字符变化时可能不变，文字/数字区域要用 exact_rois。
+    """
+    x, y, w, h = (int(v) for v in roi)
+    region = image[max(y, 0):y + h, max(x, 0):x + w]
+    if region.ndim == 3:
+        region = region[:, :, :3].mean(axis=2, dtype=np.float32)
+    height, width = region.shape
+    cell_h, cell_w = height // HASH_SIZE, width // (HASH_SIZE + 1)
+    if cell_h == 0 or cell_w == 0:
+        # ROI 比哈希网格还小，按最近邻取样放大到网格大小
+        rows = np.linspace(0, max(height - 1, 0), HASH_SIZE).astype(int)
+        cols = np.linspace(0, max(width - 1, 0), HASH_SIZE + 1).astype(int)
+        small = region[rows][:, cols] if height and width else np.zeros((HASH_SIZE, HASH_SIZE + 1))
+    else:
+        # 裁成网格的整数倍后分块求平均
+        small = (
+            region[: cell_h * HASH_SIZE, : cell_w * (HASH_SIZE + 1)]
+            .reshape(HASH_SIZE, cell_h, HASH_SIZE + 1, cell_w)
+            .mean(axis=(1, 3))
+        )
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: Tuple[int, ...], b: Tuple[int, ...]) -> int:
+    return sum(bin(x ^ y).count("1") for x, y in zip(a, b))
+
+
+class FrameGate:
+    """
+    记录每个节点上次识别时 ROI 的哈希和结果。
+    同一节点再次识别时，如果 ROI 哈希没有变化且结果未超过 max_age 秒，直接复用上次结果。
+    感知哈希允许 tolerance 以内的差异，精确哈希必须完全一致。
+    """
+
+    def __init__(self):
+        # "会话|节点名" -> (感知哈希, 精确哈希, 结果, 记录时间)
+        self._entries: Dict[str, Tuple[Tuple[int, ...], Tuple[int, ...], Any, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: str, frame_hash: Tuple[int, ...], exact_hash: Tuple[int, ...],
+               max_age: float, tolerance: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_hash, cached_exact, result, stored_at = entry
+                if (
+                    time.monotonic() - stored_at <= max_age
+                    and cached_exact == exact_hash
+                    and hamming(cached_hash, frame_hash) <= tolerance
+                ):
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def store(self, key: str, frame_hash: Tuple[int, ...], exact_hash: Tuple[int, ...], result: Any):
+        with self._lock:
+            self._entries[key] = (frame_hash, exact_hash, result, time.monotonic())
+
+    def invalidate(self, key: Optional[str] = None):
+        """清空指定节点或全部节点的缓存"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# 全局门控实例
+gate = FrameGate()
+
+
+def _gate_options(param_str: str) -> Optional[Dict[str, Any]]:
+    """从 custom_recognition_param 中读取 frame_gate 配置，没配置时返回 None(不启用)"""
+    if not param_str or "frame_gate" not in param_str:
+        return None
+    try:
+        params = json.loads(param_str)
+    except json.JSONDecodeError:
+        return None
+    options = params.get("frame_gate") if isinstance(params, dict) else None
+    if not options:
+        return None
+    if options is True:
+        options = {}
+    return options
+
+
+def resolve_rois(context, rois: List[Union[List[int], str]]) -> Optional[List[List[int]]]:
+    """把写成节点名的 roi 换成该节点在 pipeline 中的 roi，有节点读不到固定 roi 时返回 None"""
+    resolved = []
+    for roi in rois:
+        if isinstance(roi, str):
+            roi = ocr_cache.node_roi(context, roi)
+            if roi is None:
+                return None
+        resolved.append(roi)
+    return resolved
+
+
+def gated(rois: List[Union[List[int], str]], exact_rois: List[Union[List[int], str]] = (), cache_hits: bool = True):
+    """
+    装饰 CustomRecognition.analyze，给识别加上画面变化门控。
+
+    需要在节点的 custom_recognition_param 中按节点开启:
+        "frame_gate": {"max_age": 3, "tolerance": 2}
+    max_age 为结果最多复用多少秒(必填的保险，避免画面没变但游戏状态变了时一直用旧结果)，
+    tolerance 为允许的哈希汉明距离。
+
+    Args:
+        rois: 识别结果只取决于这些区域的画面，对它们做感知哈希。可以写节点名，表示该节点在 pipeline 中的 roi
+        exact_rois: 同上，但按像素内容精确比较。OCR 读数字/文字的区域放这里，一个字符变了也要重新识别
+        cache_hits: 为 False 时只复用"未命中"的结果。命中结果依赖其他状态(例如当前敌人)时使用
+    """
+    def decorator(analyze):
+        @functools.wraps(analyze)
+        def wrapper(self, context, argv: CustomRecognition.AnalyzeArg):
+            options = _gate_options(argv.custom_recognition_param)
+            gate_rois = resolve_rois(context, rois) if options is not None else None
+            exact = resolve_rois(context, exact_rois) if gate_rois is not None else None
+            if exact is None:
+                return analyze(self, context, argv)
+
+            max_age = float(options.get("max_age", 3))
+            tolerance = int(options.get("tolerance", DEFAULT_TOLERANCE))
+            # 不同 tasker 的同名节点各自缓存
+            key = f"{session.of(context).key}|{argv.node_name}"
+            frame_hash = tuple(dhash(argv.image, roi) for roi in gate_rois)
+            exact_hash = tuple(ocr_cache.content_hash(argv.image, roi) for roi in exact)
+
+            cached = gate.lookup(key, frame_hash, exact_hash, max_age, tolerance)
+            if cached is not None:
+                return cached
+
+            result = analyze(self, context, argv)
+            is_hit = isinstance(result, CustomRecognition.AnalyzeResult) and result.box is not None
+            if cache_hits or not is_hit:
+                gate.store(key, frame_hash, exact_hash, result)
+            else:
+                gate.invalidate(key)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_all():
+    """任务切换时调用，清空所有节点的缓存"""
+    gate.invalidate()
+    logging.debug(f"[FrameGate] 清空缓存，累计复用 {gate.hits} 次，实际识别 {gate.misses} 次")
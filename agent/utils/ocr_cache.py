@@ -0,0 +1,116 @@
+# input: 自定义识别的截图，pipeline 中 OCR 节点的 roi
+# output: 为 common_func、battle_reco 提供"同样的像素不重复 OCR"的能力
+# pos: OCR 结果缓存。按 (节点名, ROI 像素哈希) 记住识别结果，有界 LRU，任务切换时由 common_sink 清空
+
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+import logging
+import threading
+import zlib
+
+import numpy as np
+from maa.context import Context
+
+# 最多缓存的识别结果数。OCR 节点不多，每个节点留几十个不同画面已经足够
+DEFAULT_CAPACITY = 128
+
+
+class OcrCache:
+    """
+    有界 LRU：key -> 识别结果，超出容量时淘汰最久没用过的。
+    同一个 key 的识别结果只取决于像素，不会过期，只在容量不够或显式清空时丢弃。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, result: Any):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, node: Optional[str] = None):
+        """清空指定节点或全部节点的缓存"""
+        with self._lock:
+            if node is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == node]:
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 全局缓存实例
+cache = OcrCache()
+
+
+def content_hash(image: np.ndarray, roi: List[int]) -> int:
+    """ROI 像素的 CRC32。只用来区分画面，不需要抗碰撞，越快越好"""
+    x, y, w, h = roi
+    region = image[max(y, 0):y + h, max(x, 0):x + w]
+    return zlib.crc32(np.ascontiguousarray(region))
+
+
+def node_roi(context: Context, node: str) -> Optional[List[int]]:
+    """
+    读取节点在 pipeline 中的固定 roi(叠加 roi_offset)。
+    roi 写成节点名(跟随其他节点的识别结果)或没有 roi 时返回 None，这类节点不缓存。
+    """
+    data = context.get_node_data(node)
+    if not data:
+        return None
+    param = data.get("recognition", {}).get("param", {})
+    roi = param.get("roi")
+    if not isinstance(roi, list) or len(roi) != 4:
+        return None
+    offset = param.get("roi_offset") or [0, 0, 0, 0]
+    return [int(v) + int(d) for v, d in zip(roi, offset)]
+
+
+def cache_key(context: Context, image: np.ndarray, node: str) -> Optional[Tuple[str, Tuple[int, ...], int]]:
+    roi = node_roi(context, node)
+    if roi is None:
+        return None
+    return (node, tuple(roi), content_hash(image, roi))
+
+
+def run_recognition(context: Context, node: str, image: np.ndarray):
+    """
+    context.run_recognition 的缓存版本，只用于 roi 固定、不带 pipeline_override 的 OCR 节点。
+    ROI 内像素与之前某次完全相同时直接返回那次的识别结果，调用方不要修改返回值中的数据。
+    """
+    key = cache_key(context, image, node)
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    reco_detail = context.run_recognition(node, image)
+    # 识别调用本身失败(返回 None)时不缓存，下次重新识别
+    if key is not None and reco_detail is not None:
+        cache.put(key, reco_detail)
+    return reco_detail
+
+
+def invalidate(node: Optional[str] = None):
+    """清空缓存。OCR 节点参数或资源变化时调用"""
+    cache.invalidate(node)
+    logging.debug(f"[OcrCache] 清空缓存，累计命中 {cache.hits} 次，实际识别 {cache.misses} 次")
@@ -0,0 +1,298 @@
+# input: AgentServer 中已注册的自定义识别/动作
+# output: 为 main、common_action 和 supervisor 提供耗时统计、报告与可合并的快照
+# pos: 记录每个自定义节点 run/analyze 以及内部 run_recognition 的耗时，按 p50/p95/p99 输出
+
+from contextlib import contextmanager
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from maa.agent.agent_server import AgentServer
+from maa.context import Context
+from . import common_func
+from . import file_lock
+from . import frame_gate
+from . import ocr_cache
+
+# 每个二进制量级拆分成多少个子桶，5 位即 32 个，误差约 3%
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+# 记录上限约 2^31 微秒(半小时),超过的按上限记
+MAX_SHIFT = 31 - SUB_BUCKET_BITS + 1
+BUCKET_COUNT = SUB_BUCKET_COUNT + MAX_SHIFT * SUB_BUCKET_HALF
+
+
+class LatencyHistogram:
+    """
+    固定大小的 HDR 风格直方图，单位为微秒。
+    小于 32us 的值逐一计数，更大的值按"量级 + 高 5 位"分桶，
+    所以不论记录多少次，占用的内存都是固定的。
+    """
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.total_count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    @staticmethod
+    def bucket_index(value_us: int) -> int:
+        """把数值映射到桶序号"""
+        if value_us < SUB_BUCKET_COUNT:
+            return max(value_us, 0)
+        shift = value_us.bit_length() - SUB_BUCKET_BITS
+        if shift > MAX_SHIFT:
+            return BUCKET_COUNT - 1
+        mantissa = value_us >> shift  # 范围 [16, 31]
+        return SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (mantissa - SUB_BUCKET_HALF)
+
+    @staticmethod
+    def bucket_value(index: int) -> int:
+        """桶序号对应数值区间的中点，用于估算百分位"""
+        if index < SUB_BUCKET_COUNT:
+            return index
+        shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+        mantissa = (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF + SUB_BUCKET_HALF
+        low = mantissa << shift
+        return low + (1 << shift) // 2
+
+    def record(self, value_us: int):
+        self.counts[self.bucket_index(value_us)] += 1
+        self.total_count += 1
+        self.total_us += value_us
+        self.max_us = max(self.max_us, value_us)
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+
+    def percentile(self, percent: float) -> int:
+        """返回第 percent 百分位的耗时估计值(微秒)"""
+        if self.total_count == 0:
+            return 0
+        target = max(1, int(self.total_count * percent / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                # 估计值不应超出实际记录到的范围
+                return min(max(self.bucket_value(index), self.min_us), self.max_us)
+        return self.max_us
+
+    def to_dict(self) -> dict:
+        """导出为可 JSON 序列化的字典，只保留非零的桶"""
+        return {
+            "counts": {str(index): count for index, count in enumerate(self.counts) if count},
+            "total_count": self.total_count,
+            "total_us": self.total_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+        }
+
+    def merge(self, data: dict):
+        """并入 to_dict 导出的另一份直方图。桶的划分完全相同，合并后的百分位与一起记录时一致"""
+        for index, count in data.get("counts", {}).items():
+            self.counts[int(index)] += count
+        self.total_count += data.get("total_count", 0)
+        self.total_us += data.get("total_us", 0)
+        self.max_us = max(self.max_us, data.get("max_us", 0))
+        other_min = data.get("min_us")
+        if other_min is not None:
+            self.min_us = other_min if self.min_us is None else min(self.min_us, other_min)
+
+
+# supervisor 通过这两个环境变量告诉子进程把统计快照写到哪里、多久写一次
+SNAPSHOT_PATH_ENV = "MSA_METRICS_FILE"
+SNAPSHOT_INTERVAL_ENV = "MSA_METRICS_INTERVAL"
+
+# 全部直方图，key 形如 "should_use_potion|进行AP恢复" 或 "should_use_potion|进行AP恢复 > FreeRecover"
+histograms: Dict[str, LatencyHistogram] = {}
+_lock = threading.Lock()
+# 记录当前线程正在执行的自定义节点，供内部 run_recognition 归属
+_current = threading.local()
+_installed = False
+
+
+def record(key: str, elapsed_ns: int):
+    """记录一次耗时"""
+    with _lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram()
+        histogram.record(elapsed_ns // 1000)
+
+
+def current_key():
+    """当前线程正在执行的自定义节点(计时用的 key)，不在自定义节点内时为 None"""
+    return getattr(_current, "key", None)
+
+
+@contextmanager
+def attributed(key):
+    """在 with 块内把当前线程的 run_recognition 耗时记在 key 名下，供子识别线程沿用发起节点的名字"""
+    parent = getattr(_current, "key", None)
+    _current.key = key
+    try:
+        yield
+    finally:
+        _current.key = parent
+
+
+def _timed_custom(reg_name: str, func):
+    """包装 run/analyze，按 注册名|节点名 计时"""
+
+    @functools.wraps(func)
+    def wrapper(context, argv):
+        key = f"{reg_name}|{argv.node_name}"
+        parent = getattr(_current, "key", None)
+        _current.key = key
+        start = time.perf_counter_ns()
+        try:
+            return func(context, argv)
+        finally:
+            record(key, time.perf_counter_ns() - start)
+            _current.key = parent
+
+    return wrapper
+
+
+def _timed_run_recognition(func):
+    """包装 Context.run_recognition，记在当前自定义节点名下"""
+
+    @functools.wraps(func)
+    def wrapper(self, entry, *args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return func(self, entry, *args, **kwargs)
+        finally:
+            parent = getattr(_current, "key", None) or "<外部>"
+            record(f"{parent} > {entry}", time.perf_counter_ns() - start)
+
+    return wrapper
+
+
+def install():
+    """
+    给所有已注册的自定义识别/动作加上计时。
+    必须在所有模块 import 完成(注册完毕)之后、AgentServer.start_up 之前调用。
+    """
+    global _installed
+    if _installed:
+        return False
+
+    for name, recognition in AgentServer._custom_recognition_holder.items():
+        recognition.analyze = _timed_custom(name, recognition.analyze)
+    for name, action in AgentServer._custom_action_holder.items():
+        action.run = _timed_custom(name, action.run)
+    Context.run_recognition = _timed_run_recognition(Context.run_recognition)
+
+    _installed = True
+    return True
+
+
+def get_counters() -> Dict[str, int]:
+    """覆盖下发、画面门控和 OCR 缓存的计数"""
+    counters = common_func.override_counters
+    return {
+        "override_sent": counters["sent"],
+        "override_skipped": counters["skipped"],
+        "frame_gate_hits": frame_gate.gate.hits,
+        "frame_gate_misses": frame_gate.gate.misses,
+        "ocr_cache_hits": ocr_cache.cache.hits,
+        "ocr_cache_misses": ocr_cache.cache.misses,
+    }
+
+
+def format_report(source: Dict[str, LatencyHistogram], counters: Dict[str, int]) -> str:
+    """把直方图和计数整理成报告，按 p99 从高到低排序，方便一眼找到最慢的节点"""
+    rows = [
+        (key, h.total_count, h.percentile(50), h.percentile(95), h.percentile(99), h.max_us)
+        for key, h in source.items()
+    ]
+    override_line = (
+        f"pipeline 覆盖: 下发 {counters.get('override_sent', 0)} 次, 跳过重复 {counters.get('override_skipped', 0)} 次\n"
+        f"画面门控: 复用 {counters.get('frame_gate_hits', 0)} 次, 实际识别 {counters.get('frame_gate_misses', 0)} 次\n"
+        f"OCR 缓存: 命中 {counters.get('ocr_cache_hits', 0)} 次, 实际识别 {counters.get('ocr_cache_misses', 0)} 次"
+    )
+    if not rows:
+        return f"=== 自定义节点耗时 ===\n(暂无数据)\n{override_line}"
+
+    rows.sort(key=lambda row: row[4], reverse=True)
+    lines = ["=== 自定义节点耗时 (ms) ===", "次数 | p50 | p95 | p99 | max | 节点"]
+    for key, count, p50, p95, p99, max_us in rows:
+        lines.append(
+            f"{count} | {p50 / 1000:.2f} | {p95 / 1000:.2f} | {p99 / 1000:.2f} | {max_us / 1000:.2f} | {key}"
+        )
+    lines.append(override_line)
+    return "\n".join(lines)
+
+
+def get_report() -> str:
+    """生成本进程的耗时报告"""
+    with _lock:
+        current = {key: h for key, h in histograms.items()}
+        return format_report(current, get_counters())
+
+
+def dump_report():
+    """把耗时报告输出到日志"""
+    logging.info(get_report())
+
+
+def reset():
+    """清空已记录的数据"""
+    with _lock:
+        histograms.clear()
+
+
+# ============================================================================
+# 快照：多个 agent 进程(见 supervisor)各自写出，由 supervisor 合并
+# ============================================================================
+
+def snapshot() -> dict:
+    """导出当前全部统计，可以 JSON 序列化"""
+    with _lock:
+        data = {key: h.to_dict() for key, h in histograms.items()}
+    return {
+        "pid": os.getpid(),
+        "time": time.time(),
+        "histograms": data,
+        "counters": get_counters(),
+    }
+
+
+def write_snapshot(path: str) -> bool:
+    """把快照原子写入 path，写入失败只记日志"""
+    try:
+        file_lock.atomic_write_json(path, snapshot())
+        return True
+    except OSError as e:
+        logging.warning(f"[PerfMonitor] 写入统计快照失败 {path}: {e}")
+        return False
+
+
+def start_snapshot_writer(path: str, interval: float = 30.0) -> threading.Thread:
+    """后台线程每隔 interval 秒写一次快照"""
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            write_snapshot(path)
+
+    thread = threading.Thread(target=loop, name="PerfSnapshotWriter", daemon=True)
+    thread.start()
+    return thread
+
+
+def merge_snapshots(snapshots: List[dict]) -> Tuple[Dict[str, LatencyHistogram], Dict[str, int]]:
+    """合并多个进程的快照，返回 (直方图, 计数)，可直接交给 format_report"""
+    merged: Dict[str, LatencyHistogram] = {}
+    counters: Dict[str, int] = {}
+    for data in snapshots:
+        for key, histogram in data.get("histograms", {}).items():
+            merged.setdefault(key, LatencyHistogram()).merge(histogram)
+        for name, value in data.get("counters", {}).items():
+            counters[name] = counters.get(name, 0) + value
+    return merged, counters
@@ -0,0 +1,156 @@
+# input: 自定义识别/动作收到的 context(其中的 tasker)
+# output: 为各 manager、common_func、frame_gate 提供按 tasker 隔离的状态
+# pos: 会话注册表。一个 agent 进程同时服务多个游戏窗口时，每个 tasker 对应一个会话，状态互不干扰
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, TypeVar
+import functools
+import threading
+
+from maa.agent.agent_server import AgentServer
+from maa.context import Context
+
+T = TypeVar("T")
+
+# 没有绑定 tasker 时(离线工具、回放、单元脚本)使用的会话
+DEFAULT_KEY = "default"
+
+
+class Session:
+    """
+    一个 tasker 的全部运行状态。
+    各 manager 通过 get(名字, 工厂函数) 取出自己的状态对象，第一次访问时创建。
+    """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        # 跨重启不变的实例标识(设备 uuid)，用于区分持久化记录，第一次绑定 context 时取得
+        self.identity: Optional[str] = DEFAULT_KEY if key == DEFAULT_KEY else None
+        self._states: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, factory: Callable[[], T]) -> T:
+        state = self._states.get(name)
+        if state is None:
+            with self._lock:
+                state = self._states.get(name)
+                if state is None:
+                    state = self._states[name] = factory()
+        return state
+
+    def reset(self, name: Optional[str] = None):
+        """丢弃指定(或全部)状态，下次访问时重新创建"""
+        with self._lock:
+            if name is None:
+                self._states.clear()
+            else:
+                self._states.pop(name, None)
+
+
+class SessionRegistry:
+    """tasker 标识 -> 会话"""
+
+    def __init__(self):
+        self._sessions: Dict[Hashable, Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Session:
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.setdefault(key, Session(key))
+        return session
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._sessions)
+
+
+class _CurrentSession(threading.local):
+    # 类属性作为默认值，未绑定时直接读到 None，不走 getattr 的异常分支(热路径上每次都要读)
+    session: Optional[Session] = None
+
+
+# 全局注册表
+registry = SessionRegistry()
+# 当前线程正在处理的会话，由 install() 包装的自定义节点在调用期间绑定
+_current = _CurrentSession()
+_installed = False
+
+
+def tasker_key(tasker) -> Hashable:
+    """
+    用 tasker 句柄区分会话。
+    同一个 tasker 每次回调传进来的 Python 对象不一定是同一个，但句柄值不变。
+    """
+    handle = getattr(tasker, "_handle", None)
+    value = getattr(handle, "value", handle)
+    return value if value is not None else id(tasker)
+
+
+def controller_identity(tasker) -> Optional[str]:
+    """tasker 所连设备的 uuid(ADB 为设备地址，Win32 为窗口)，取不到时返回 None"""
+    try:
+        return tasker.controller.uuid or None
+    except (AttributeError, RuntimeError):
+        return None
+
+
+def of(context: Context) -> Session:
+    """取出 context 所属 tasker 的会话"""
+    session = registry.get(tasker_key(context.tasker))
+    if session.identity is None:
+        # tasker 句柄每次启动都不同，持久化记录按设备区分；取不到设备时只在本次运行内区分
+        session.identity = controller_identity(context.tasker) or f"tasker-{session.key}"
+    return session
+
+
+def current() -> Session:
+    """当前线程绑定的会话，没有绑定时返回默认会话"""
+    session = _current.session
+    return session if session is not None else registry.get(DEFAULT_KEY)
+
+
+@contextmanager
+def bind(session: Session):
+    """在 with 块内把 session 设为当前线程的会话，可嵌套"""
+    parent = _current.session
+    _current.session = session
+    try:
+        yield session
+    finally:
+        _current.session = parent
+
+
+def _bound_custom(func):
+    """包装 run/analyze，调用期间绑定 context 对应的会话"""
+
+    @functools.wraps(func)
+    def wrapper(context, argv):
+        with bind(of(context)):
+            return func(context, argv)
+
+    return wrapper
+
+
+def install():
+    """
+    让所有已注册的自定义识别/动作在各自 tasker 的会话中执行，并给 Context 加上 session 属性。
+    必须在所有模块 import 完成(注册完毕)之后、AgentServer.start_up 之前调用。
+    """
+    global _installed
+    if _installed:
+        return False
+
+    for recognition in AgentServer._custom_recognition_holder.values():
+        recognition.analyze = _bound_custom(recognition.analyze)
+    for action in AgentServer._custom_action_holder.values():
+        action.run = _bound_custom(action.run)
+    Context.session = property(of)
+
+    _installed = True
+    return True
@@ -0,0 +1,85 @@
+"""
+战斗决策表微基准
+
+对比两种获取战斗行动指令的方式：
+1) 现算：每次按配置重新判断并新建 BattleAction（编译决策表之前的做法）
+2) 查表：FinalizeBattleConfig 编译好的只读决策表
+
+用法示例：
+  python my_tools/bench_battle_table.py
+  python my_tools/bench_battle_table.py --number 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "agent"
+if str(AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENT_DIR))
+
+from battle import battle_manager  # noqa: E402
+
+# 跑图时常见的敌人组合，名字未知的按一般感染者处理
+SAMPLES = [
+    ("普通感染者", battle_manager.MODE_NORMAL),
+    ("天狼星", battle_manager.MODE_RAMPAGE),
+    ("超级天狼星", battle_manager.MODE_NORMAL),
+    ("终极天狼星", battle_manager.MODE_RAMPAGE),
+]
+
+
+def legacy_lookup(name: str, mode: str):
+    """编译决策表之前的路径：现算指令，再单独查卡组 ROI"""
+    category = battle_manager.ENEMY_NAME_MAP.get(name, battle_manager.CAT_GENERAL)
+    action = battle_manager.resolve_battle_action(category, mode)
+    return action, battle_manager.BATTLE_ROI[action.deck_name]
+
+
+def table_lookup(name: str, mode: str):
+    action = battle_manager.get_battle_action(name, mode)
+    return action, action.click_roi
+
+
+def configure():
+    """准备一份带放生目标的配置，保证两条分支都会走到"""
+    battle_manager.set_config_value("deck_general_rampage", "卡组二")
+    battle_manager.set_config_value("deck_sirius_normal", "卡组三")
+    battle_manager.set_config_value("deck_release", "卡组四")
+    battle_manager.set_config_value("release_red_rampage", True)
+    battle_manager.compile_decision_table()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="战斗决策表微基准")
+    parser.add_argument("--number", type=int, default=100000, help="每种方式调用的次数")
+    args = parser.parse_args()
+
+    configure()
+    for name, mode in SAMPLES:
+        legacy_action, legacy_roi = legacy_lookup(name, mode)
+        table_action, table_roi = table_lookup(name, mode)
+        if legacy_action != table_action or tuple(legacy_roi) != table_roi:
+            print(f"[ERROR] {name}/{mode} 查表结果与现算不一致: {table_action} != {legacy_action}")
+            return 1
+
+    def run(lookup):
+        for name, mode in SAMPLES:
+            lookup(name, mode)
+
+    rounds = max(args.number // len(SAMPLES), 1)
+    print(f"=== 战斗决策 ({rounds * len(SAMPLES)} 次调用) ===")
+    results = {}
+    for label, lookup in (("现算", legacy_lookup), ("查表", table_lookup)):
+        seconds = min(timeit.repeat(lambda: run(lookup), number=rounds, repeat=5))
+        results[label] = seconds
+        print(f"{label:<4} {seconds * 1e9 / (rounds * len(SAMPLES)):.0f} ns/次")
+    print(f"查表加速 {results['现算'] / results['查表']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+数字模板识别 vs OCR 对比工具
+
+解决的问题：
+1) 从录制的数字截图中导出 0~9 模板到 assets/resource/image/数字/
+2) 在同一批截图上对比模板识别和 OCR 的准确率与单次耗时
+
+截图目录中每个文件是一张只包含数字区域的 BGR 截图（numpy 保存的 .npy），
+文件名以正确数字开头，例如 12_big_potion.npy、87_rank.npy。
+
+用法示例：
+  python my_tools/bench_digit_reco.py <截图目录> --export-templates assets/resource/image/数字
+  python my_tools/bench_digit_reco.py <截图目录>
+  python my_tools/bench_digit_reco.py <截图目录> --no-ocr   只测模板识别（没有 OCR 模型时使用）
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+import digit_classifier
+
+RESOURCE_DIR = Path(__file__).resolve().parent.parent / "assets" / "resource"
+
+
+def load_crops(crop_dir: Path) -> list[tuple[str, numpy.ndarray]]:
+    crops = []
+    for path in sorted(crop_dir.glob("*.npy")):
+        label = path.stem.split("_")[0]
+        if not label.isdigit():
+            print(f"[WARN] 跳过文件名不以数字开头的截图: {path.name}")
+            continue
+        crops.append((label, numpy.load(path)))
+    return crops
+
+
+def export_templates(crops: list[tuple[str, numpy.ndarray]], out_dir: Path) -> int:
+    """切分每张截图，字符数与文件名一致时按位置取出每个数字，每个数字保存第一次出现的字形"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    saved: set[str] = set()
+    for label, image in crops:
+        gray = digit_classifier.to_gray(image)
+        spans = digit_classifier.segment_glyphs(digit_classifier.binarize(gray))
+        if len(spans) != len(label):
+            continue
+        for digit, (start, end) in zip(label, spans):
+            if digit in saved:
+                continue
+            digit_classifier.save_png_gray(out_dir / f"{digit}.png", gray[:, start:end].astype(numpy.uint8))
+            saved.add(digit)
+
+    missing = sorted(set("0123456789") - saved)
+    print(f"已导出 {len(saved)} 个数字模板到 {out_dir}")
+    if missing:
+        print(f"[WARN] 缺少数字 {missing} 的样本，模板库不完整时无法对比")
+    return 0 if not missing else 1
+
+
+def bench(name: str, crops: list[tuple[str, numpy.ndarray]], recognize, repeat: int) -> None:
+    samples = []
+    correct = 0
+    for label, image in crops:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = recognize(image)
+            samples.append((time.perf_counter() - start) * 1000)
+        correct += text == label
+    print(
+        f"{name:<8} 正确 {correct}/{len(crops)} | "
+        f"mean={statistics.fmean(samples):.3f}ms p50={statistics.median(samples):.3f}ms max={max(samples):.3f}ms"
+    )
+
+
+def make_ocr_recognizer():
+    """用 MaaFramework 加载 assets/resource 中的 OCR 模型，返回识别函数；没有模型时返回 None"""
+    if not (RESOURCE_DIR / "model" / "ocr").is_dir():
+        print(f"[WARN] 未找到 OCR 模型 {RESOURCE_DIR / 'model' / 'ocr'}，跳过 OCR 对比（可先运行 tools/configure.py）")
+        return None
+
+    from maa.controller import DbgController
+    from maa.pipeline import JOCR, JRecognitionType
+    from maa.resource import Resource
+    from maa.tasker import Tasker
+    from maa.toolkit import Toolkit
+
+    Toolkit.init_option(str(Path(__file__).resolve().parent.parent))
+    resource = Resource()
+    resource.post_bundle(RESOURCE_DIR).wait()
+    controller = DbgController(RESOURCE_DIR / "image")
+    controller.post_connection().wait()
+    tasker = Tasker()
+    tasker.bind(resource, controller)
+
+    def recognize(image: numpy.ndarray) -> str:
+        height, width = image.shape[:2]
+        param = JOCR(roi=(0, 0, width, height))
+        detail = tasker.post_recognition(JRecognitionType.OCR, param, image).wait().get()
+        if not detail or not detail.nodes or not detail.nodes[0].recognition:
+            return ""
+        blocks = sorted(detail.nodes[0].recognition.filtered_results, key=lambda block: block.box[0])
+        return "".join(ch for block in blocks for ch in block.text if ch.isdigit())
+
+    return recognize
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="数字模板识别 vs OCR 对比")
+    parser.add_argument("crops", type=Path, help="录制的数字截图目录(.npy)")
+    parser.add_argument("--export-templates", type=Path, help="从截图导出 0~9 模板到该目录")
+    parser.add_argument("--templates", type=Path, default=digit_classifier.TEMPLATE_DIR, help="对比时使用的模板目录")
+    parser.add_argument("--repeat", type=int, default=20, help="每张截图重复识别次数")
+    parser.add_argument("--no-ocr", action="store_true", help="不跑 OCR 对比")
+    args = parser.parse_args()
+
+    crops = load_crops(args.crops)
+    if not crops:
+        print(f"[ERROR] {args.crops} 中没有可用的截图")
+        return 1
+
+    if args.export_templates:
+        return export_templates(crops, args.export_templates)
+
+    bank = digit_classifier.DigitTemplateBank.load(args.templates)
+    if bank is None:
+        print(f"[ERROR] {args.templates} 中的数字模板不完整，请先使用 --export-templates 导出模板")
+        return 1
+
+    print(f"=== 数字识别对比 ({len(crops)} 张截图, 每张 {args.repeat} 次) ===")
+    bench("模板", crops, lambda image: bank.classify(image)[0], args.repeat)
+    ocr = None if args.no_ocr else make_ocr_recognizer()
+    if ocr is not None:
+        bench("OCR", crops, ocr, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+并发子识别 vs 串行子识别基准
+
+用回放替身(replay_harness)驱动 ShouldUsePotion，对比
+common_func.run_concurrently 并发执行子识别与串行执行(SUB_RECOGNITION_WORKERS = 1)的耗时。
+
+回放替身的 run_recognition 不做真正的识别，这里按节点的识别类型补上模拟耗时(sleep，
+与 MaaFramework 在原生代码中识别时一样会释放 GIL)，耗时可以用参数调整成实测值。
+"门控未命中" 一项在没有录制结果的画面上运行，门控识别未命中，用来观察取消后多等的时间。
+ShouldBossPause 在 boss 界面外也会轮询，门控多半未命中，所以保持先门控后 OCR 的串行顺序，不在这里对比。
+
+用法示例：
+  python my_tools/bench_sub_reco.py
+  python my_tools/bench_sub_reco.py --number 100 --ocr-ms 30 --template-ms 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from replay_harness import ReplayContext, ReplayHarness
+
+from recover import recover_manager  # noqa: E402  replay_harness 已把 agent 目录加入 sys.path
+from utils import common_func, frame_gate, ocr_cache  # noqa: E402
+
+SAMPLE_DIR = Path(__file__).resolve().parent / "replay_samples" / "basic"
+
+SCENARIOS = [
+    # (说明, 录制中的调用名, 使用的画面)
+    ("吃药(免费恢复 + 库存)", "should_use_potion", "recover"),
+    ("吃药(门控未命中)", "should_use_potion", "__empty__"),
+]
+
+
+def install_latency(harness: ReplayHarness, latency_ms: dict[str, float], default_ms: float) -> None:
+    """给回放替身的 run_recognition 按节点识别类型加上模拟耗时"""
+    original = ReplayContext.run_recognition
+    pipeline = harness.context.pipeline
+
+    def run_recognition(self, entry, image, pipeline_override=None):
+        recognition = (pipeline.get(entry) or {}).get("recognition", {})
+        kind = recognition.get("type") if isinstance(recognition, dict) else recognition
+        time.sleep(latency_ms.get(kind, default_ms) / 1000)
+        return original(self, entry, image, pipeline_override)
+
+    ReplayContext.run_recognition = run_recognition
+
+
+def measure(harness: ReplayHarness, call: dict, number: int) -> list[float]:
+    samples = []
+    for _ in range(number):
+        # 每次都让子识别真正执行：清空画面门控和 OCR 缓存，重置药水账本让库存重新读取
+        frame_gate.invalidate_all()
+        ocr_cache.invalidate()
+        recover_manager.get_potion_stats().reset_usage()
+        start = time.perf_counter()
+        harness.run_call(call)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="并发子识别 vs 串行子识别基准")
+    parser.add_argument("--number", type=int, default=50, help="每种方式每个场景的调用次数")
+    parser.add_argument("--ocr-ms", type=float, default=20.0, help="OCR 识别的模拟耗时(毫秒)")
+    parser.add_argument("--template-ms", type=float, default=6.0, help="TemplateMatch 识别的模拟耗时(毫秒)")
+    parser.add_argument("--other-ms", type=float, default=2.0, help="其他识别的模拟耗时(毫秒)")
+    parser.add_argument("--workers", type=int, default=common_func.SUB_RECOGNITION_WORKERS, help="并发时的子识别线程数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    ReplayHarness.load_agent()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    harness = ReplayHarness(SAMPLE_DIR)
+    harness.apply_setup()
+    install_latency(harness, {"OCR": args.ocr_ms, "TemplateMatch": args.template_ms}, args.other_ms)
+    calls = {call["name"]: call for call in harness.recording["calls"]}
+
+    print(f"=== 子识别 串行 vs 并发({args.workers} 线程)，每项 {args.number} 次，单位 ms ===")
+    print("p50 串行 | p50 并发 | 加速 | 场景")
+    for title, name, frame in SCENARIOS:
+        call = dict(calls[name], frame=frame)
+        results = {}
+        for label, workers in (("serial", 1), ("concurrent", args.workers)):
+            common_func.SUB_RECOGNITION_WORKERS = workers
+            measure(harness, call, 3)  # 预热，线程池在第一次并发调用时创建
+            results[label] = statistics.median(measure(harness, call, args.number))
+        speedup = results["serial"] / results["concurrent"] if results["concurrent"] else float("inf")
+        print(f"{results['serial']:.2f} | {results['concurrent']:.2f} | {speedup:.2f}x | {title}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+数字模板分类器(离线实验用，agent 运行时不使用)
+
+用 NumPy 做游戏固定字体短数字的模板匹配：大津法二值化、按列投影切分字符、
+与 0~9 模板一次矩阵乘法打分。由 bench_digit_reco.py 调用，用来从录制截图导出模板、
+对比模板识别与 OCR 的准确率和耗时。模板库和准确率数据随仓库提交之前，
+PotionStock / CurrentRank / 记录竞技场积分 等节点都直接使用 OCR。
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import struct
+import zlib
+
+import numpy as np
+
+# 模板统一缩放到的大小(宽, 高)
+GLYPH_SIZE = (12, 20)
+# 面积小于这个像素数的连通列视为噪点
+MIN_GLYPH_PIXELS = 4
+
+# 默认模板目录
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "assets" / "resource" / "image" / "数字"
+
+
+# ==========================================
+# PNG 读写 (与 agent 一样只依赖 numpy，不需要 OpenCV/Pillow)
+# ==========================================
+
+def _paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def load_png_gray(path: Path) -> np.ndarray:
+    """
+    读取非隔行扫描的 PNG 并转为灰度图(uint8)。
+    支持灰度/RGB/调色板/带透明通道，以及 oxipng 压缩后可能出现的 1/2/4 位深。
+    """
+    data = Path(path).read_bytes()
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError(f"不是 PNG 文件: {path}")
+
+    pos = 8
+    idat = b""
+    palette = None
+    width = height = bit_depth = color_type = interlace = 0
+    while pos < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b"IHDR":
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", chunk)
+        elif chunk_type == b"PLTE":
+            palette = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, 3)
+        elif chunk_type == b"IDAT":
+            idat += chunk
+        elif chunk_type == b"IEND":
+            break
+
+    if interlace:
+        raise ValueError(f"不支持隔行扫描的 PNG: {path}")
+    if bit_depth == 16:
+        raise ValueError(f"不支持 16 位 PNG: {path}")
+
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    bits_per_pixel = channels * bit_depth
+    stride = (width * bits_per_pixel + 7) // 8
+    bpp = max(1, bits_per_pixel // 8)
+
+    raw = zlib.decompress(idat)
+    rows = np.zeros((height, stride), dtype=np.uint8)
+    prev = np.zeros(stride, dtype=np.int32)
+    for y in range(height):
+        start = y * (stride + 1)
+        filter_type = raw[start]
+        line = np.frombuffer(raw, dtype=np.uint8, count=stride, offset=start + 1).astype(np.int32)
+        if filter_type == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif filter_type == 2:
+            line = (line + prev) & 0xFF
+        elif filter_type == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif filter_type == 4:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                up_left = prev[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + _paeth(left, prev[i], up_left)) & 0xFF
+        rows[y] = line
+        prev = line
+
+    if bit_depth < 8:
+        # 把 1/2/4 位的像素展开成一字节一个
+        bits = np.unpackbits(rows, axis=1)
+        bits = bits[:, : width * bit_depth].reshape(height, width, bit_depth)
+        weights = 1 << np.arange(bit_depth - 1, -1, -1)
+        samples = (bits * weights).sum(axis=2).astype(np.uint8)
+        if color_type == 0:
+            samples = (samples.astype(np.uint16) * 255 // ((1 << bit_depth) - 1)).astype(np.uint8)
+        pixels = samples[:, :, None]
+    else:
+        pixels = rows.reshape(height, width, channels)
+
+    if color_type == 3:
+        pixels = palette[pixels[:, :, 0]]
+        channels = 3
+    if channels >= 3:
+        return pixels[:, :, :3].mean(axis=2).astype(np.uint8)
+    return pixels[:, :, 0]
+
+
+def save_png_gray(path: Path, gray: np.ndarray):
+    """把灰度图保存为 8 位 PNG，用于导出数字模板"""
+    gray = np.ascontiguousarray(gray, dtype=np.uint8)
+    height, width = gray.shape
+    raw = b"".join(b"\x00" + gray[y].tobytes() for y in range(height))
+
+    def chunk(chunk_type: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    Path(path).write_bytes(
+        b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+    )
+
+
+# ==========================================
+# 字符切分与归一化
+# ==========================================
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """BGR 或灰度图统一转为 float32 灰度"""
+    if image.ndim == 3:
+        return image[:, :, :3].mean(axis=2, dtype=np.float32)
+    return image.astype(np.float32)
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """
+    大津法二值化，返回前景(文字)为 True 的掩码。
+    文字总是比背景稀疏，所以像素数较少的一侧被认为是文字，深色字/浅色字都能处理。
+    """
+    hist = np.bincount(gray.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return np.zeros(gray.shape, dtype=bool)
+    levels = np.arange(256)
+    weight_low = np.cumsum(hist)
+    weight_high = total - weight_low
+    mean_low = np.cumsum(hist * levels)
+    mean_all = mean_low[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean_all * weight_low / total - mean_low) ** 2 / (weight_low * weight_high)
+    between = np.nan_to_num(between)
+    threshold = int(np.argmax(between))
+
+    mask = gray > threshold
+    if mask.sum() > mask.size / 2:
+        mask = ~mask
+    return mask
+
+
+def normalize_glyph(mask: np.ndarray) -> np.ndarray:
+    """裁掉空白边并最近邻缩放到 GLYPH_SIZE，返回 float32 向量"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return np.zeros(GLYPH_SIZE[0] * GLYPH_SIZE[1], dtype=np.float32)
+    cropped = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    height, width = cropped.shape
+    ys = (np.arange(GLYPH_SIZE[1]) * height // GLYPH_SIZE[1]).clip(0, height - 1)
+    xs = (np.arange(GLYPH_SIZE[0]) * width // GLYPH_SIZE[0]).clip(0, width - 1)
+    return cropped[np.ix_(ys, xs)].astype(np.float32).ravel()
+
+
+def segment_glyphs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """按列投影切分字符，返回每个字符的 (起始列, 结束列)"""
+    column_pixels = mask.sum(axis=0)
+    glyphs = []
+    start = None
+    for x, count in enumerate(np.append(column_pixels, 0)):
+        if count and start is None:
+            start = x
+        elif not count and start is not None:
+            if column_pixels[start:x].sum() >= MIN_GLYPH_PIXELS:
+                glyphs.append((start, x))
+            start = None
+    return glyphs
+
+
+# ==========================================
+# 模板库与分类
+# ==========================================
+
+class DigitTemplateBank:
+    """0~9 的数字模板，预先归一化并堆叠成矩阵，一次矩阵乘法即可给所有字符打分"""
+
+    def __init__(self, templates: Dict[str, np.ndarray]):
+        self.labels = sorted(templates)
+        vectors = np.stack([normalize_glyph(binarize(to_gray(templates[label]))) for label in self.labels])
+        self.matrix = self._standardize(vectors)
+
+    @staticmethod
+    def _standardize(vectors: np.ndarray) -> np.ndarray:
+        """减均值、除以模长，之后点积就是相关系数"""
+        centered = vectors - vectors.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(centered, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return centered / norms
+
+    @classmethod
+    def load(cls, template_dir: Path) -> Optional["DigitTemplateBank"]:
+        templates = {}
+        for digit in "0123456789":
+            path = template_dir / f"{digit}.png"
+            if path.exists():
+                templates[digit] = load_png_gray(path)
+        # 缺任何一个数字都无法可靠识别，直接不用模板
+        if len(templates) != 10:
+            return None
+        return cls(templates)
+
+    def classify(self, image: np.ndarray) -> Tuple[str, float]:
+        """
+        识别一块只包含数字的区域。
+        返回 (数字文本, 置信度)，置信度是所有字符中最低的匹配分数，没有切出字符时为 0。
+        """
+        mask = binarize(to_gray(image))
+        spans = segment_glyphs(mask)
+        if not spans:
+            return "", 0.0
+
+        height = mask.shape[0]
+        vectors = []
+        for start, end in spans:
+            # 宽度明显大于高度，多半是两个字符粘连或者不是数字，交给 OCR
+            if end - start > height:
+                return "", 0.0
+            vectors.append(normalize_glyph(mask[:, start:end]))
+
+        scores = self._standardize(np.stack(vectors)) @ self.matrix.T
+        best = scores.argmax(axis=1)
+        text = "".join(self.labels[i] for i in best)
+        confidence = float(scores[np.arange(len(best)), best].min())
+        return text, confidence
@@ -0,0 +1,415 @@
+"""
+离线回放工具：不连接 StarEra 窗口，直接驱动 agent 中注册的自定义识别/动作
+
+解决的问题：
+1) 没有游戏窗口时无法复现 ExtractEnemyInfo / EnterBattle / ShouldUsePotion 等节点的行为
+2) 无法测量自定义节点的单次耗时，版本发布前发现不了性能退化
+
+原理：
+- ReplayContext 模拟 maa.context.Context，run_recognition 返回录制好的识别结果，
+  override_pipeline / override_next / post_click 只做记录，不真正执行；
+  get_node_data 返回 assets/resource/pipeline 中的节点定义(叠加回放中的覆盖)。
+- 自定义识别/动作直接从 AgentServer 的注册表里取出实例调用，与真实运行时走同一份代码。
+
+录制目录结构（replay.json + 可选的 .npy 截图）：
+  {
+    "frames": {"battle": "battle.npy"},        # 截图名 -> numpy 保存的 BGR 图像，缺省为全黑 1280x720
+                                                # 也可以写 {"fill": [[x, y, w, h, [b, g, r]], ...]}，在全黑图上画色块
+    "recognitions": {                           # 截图名 -> 节点名 -> 录制的识别结果
+      "battle": {
+        "GiveUp": {"hit": true, "box": [1158, 522, 122, 77], "results": [{"box": [...], "score": 0.95}]},
+        "LabFilter@1136,298,15,14": {"hit": false}   # 带 roi 覆盖的识别用 "节点名@x,y,w,h" 区分
+      }
+    },
+    "calls": [                                  # 按顺序回放的调用
+      {"kind": "recognition", "name": "enter_battle", "node": "进入战斗", "frame": "battle"},
+      {"kind": "action", "name": "set_enemy_next", "node": "提取感染者信息", "param": {}}
+    ]
+  }
+  kind 为 action 时，reco_detail 取自上一次回放的自定义识别结果（与 pipeline 中同一节点先识别后动作一致）。
+  可选字段 "setup": {"模块名.属性": 值} 用于在回放前改写 manager 中的状态，
+  路径中 get_ 开头的函数会被调用，例如 "recover.recover_manager.get_potion_stats.ap.big.limit"。
+  回放不绑定 tasker，manager 状态都在默认会话中。
+
+用法示例：
+  python my_tools/replay_harness.py my_tools/replay_samples/basic
+  python my_tools/replay_harness.py my_tools/replay_samples/basic --repeat 200
+  python my_tools/replay_harness.py my_tools/replay_samples/basic --verbose  查看每次调用的覆盖和点击记录
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import logging
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "agent"
+if str(AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENT_DIR))
+
+from maa.agent.agent_server import AgentServer  # noqa: E402
+from maa.custom_action import CustomAction  # noqa: E402
+from maa.custom_recognition import CustomRecognition  # noqa: E402
+from maa.define import CustomRecognitionResult, OCRResult, Rect, RecognitionDetail  # noqa: E402
+
+DEFAULT_FRAME_SHAPE = (720, 1280, 3)
+PIPELINE_DIR = Path(__file__).resolve().parent.parent / "assets" / "resource" / "pipeline"
+
+
+def load_pipeline(pipeline_dir: Path) -> dict[str, dict[str, Any]]:
+    """读取全部 pipeline 节点定义，跳过编辑器写入的 $__mpe 配置"""
+    pipeline: dict[str, dict[str, Any]] = {}
+    for path in sorted(pipeline_dir.rglob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            for node, data in json.load(f).items():
+                if not node.startswith("$"):
+                    pipeline[node] = data
+    return pipeline
+
+
+def build_frame(spec: dict[str, Any]) -> numpy.ndarray:
+    """按 {"fill": [[x, y, w, h, [b, g, r]], ...]} 在全黑截图上画色块，供纯 numpy 的识别回放"""
+    frame = numpy.zeros(DEFAULT_FRAME_SHAPE, dtype=numpy.uint8)
+    for x, y, w, h, color in spec.get("fill", []):
+        frame[y:y + h, x:x + w] = color
+    return frame
+
+
+# ============================================================================
+# 录制数据 -> MaaFramework 数据结构
+# ============================================================================
+
+def _to_rect(value: Any) -> Optional[Rect]:
+    if value is None:
+        return None
+    if isinstance(value, Rect):
+        return value
+    x, y, w, h = value
+    return Rect(int(x), int(y), int(w), int(h))
+
+
+def build_recognition_detail(name: str, record: dict[str, Any]) -> RecognitionDetail:
+    """把录制的 JSON 识别结果转换成 RecognitionDetail，每次调用都生成新对象（业务代码会原地排序结果）"""
+    results = []
+    for item in record.get("results", []):
+        box = _to_rect(item.get("box", [0, 0, 0, 0]))
+        score = float(item.get("score", 1.0))
+        if "text" in item:
+            results.append(OCRResult(box=box, score=score, text=str(item["text"])))
+        elif "detail" in item:
+            results.append(CustomRecognitionResult(box=box, detail=item["detail"]))
+        else:
+            # TemplateMatch / ColorMatch 等结果只用到 box 和 score/count
+            results.append(OCRResult(box=box, score=score, text=""))
+
+    hit = bool(record.get("hit", bool(results)))
+    box = _to_rect(record.get("box")) if record.get("box") is not None else (results[0].box if hit and results else None)
+    return RecognitionDetail(
+        reco_id=0,
+        name=name,
+        algorithm=record.get("algorithm", "Replay"),
+        hit=hit,
+        box=box,
+        all_results=list(results),
+        filtered_results=list(results),
+        best_result=results[0] if hit and results else None,
+        raw_detail=record,
+        raw_image=numpy.zeros((0, 0, 3), dtype=numpy.uint8),
+        draw_images=[],
+    )
+
+
+# ============================================================================
+# Context / Tasker / Controller 替身
+# ============================================================================
+
+class ReplayJob:
+    """模拟 maa.job.Job，回放时点击立即完成"""
+
+    def __init__(self, job_id: int) -> None:
+        self.job_id = job_id
+
+    def wait(self) -> "ReplayJob":
+        return self
+
+    def done(self) -> bool:
+        return True
+
+    def succeeded(self) -> bool:
+        return True
+
+
+@dataclass
+class ReplaySession:
+    """一次回放过程中所有 Context 共享的状态与记录"""
+    recognitions: dict[str, dict[str, Any]]
+    frame_name: str = ""
+    clicks: list[tuple[int, int]] = field(default_factory=list)
+    overrides: list[dict[str, Any]] = field(default_factory=list)
+    recognition_calls: list[str] = field(default_factory=list)
+    missing: set[str] = field(default_factory=set)
+
+    def clear_records(self) -> None:
+        self.clicks.clear()
+        self.overrides.clear()
+        self.recognition_calls.clear()
+
+
+class ReplayController:
+    def __init__(self, session: ReplaySession) -> None:
+        self._session = session
+        self._job_id = 0
+
+    def post_click(self, x: int, y: int, contact: int = 0, pressure: int = 1) -> ReplayJob:
+        self._session.clicks.append((int(x), int(y)))
+        self._job_id += 1
+        return ReplayJob(self._job_id)
+
+
+class ReplayTasker:
+    def __init__(self, session: ReplaySession) -> None:
+        self.controller = ReplayController(session)
+
+
+class ReplayContext:
+    """
+    maa.context.Context 的回放替身。
+    只实现 agent 代码实际用到的接口：run_recognition / override_pipeline / override_next /
+    get_node_data / clone / tasker.controller.post_click。
+    """
+
+    def __init__(self, session: ReplaySession, tasker: Optional[ReplayTasker] = None) -> None:
+        self._session = session
+        self._tasker = tasker or ReplayTasker(session)
+        self.pipeline: dict[str, dict[str, Any]] = {}
+
+    @property
+    def tasker(self) -> ReplayTasker:
+        return self._tasker
+
+    def run_recognition(
+        self,
+        entry: str,
+        image: numpy.ndarray,
+        pipeline_override: Optional[dict[str, Any]] = None,
+    ) -> Optional[RecognitionDetail]:
+        frame_records = self._session.recognitions.get(self._session.frame_name, {})
+        keys = []
+        roi = ((pipeline_override or {}).get(entry) or {}).get("roi")
+        if roi is not None:
+            keys.append(f"{entry}@{','.join(str(int(v)) for v in roi)}")
+        keys.append(entry)
+
+        self._session.recognition_calls.append(keys[0])
+        for key in keys:
+            if key in frame_records:
+                return build_recognition_detail(entry, frame_records[key])
+
+        # 没有录制的识别视为未命中，并提示补录
+        self._session.missing.add(f"{self._session.frame_name}:{keys[0]}")
+        return build_recognition_detail(entry, {"hit": False})
+
+    def override_pipeline(self, pipeline_override: dict[str, Any]) -> bool:
+        self._session.overrides.append(copy.deepcopy(pipeline_override))
+        for node, data in pipeline_override.items():
+            self.pipeline.setdefault(node, {}).update(copy.deepcopy(data))
+        return True
+
+    def override_next(self, name: str, next_list: list[str]) -> bool:
+        return self.override_pipeline({name: {"next": list(next_list)}})
+
+    def get_node_data(self, name: str) -> Optional[dict[str, Any]]:
+        return copy.deepcopy(self.pipeline.get(name))
+
+    def clone(self) -> "ReplayContext":
+        cloned = ReplayContext(self._session, self._tasker)
+        cloned.pipeline = copy.deepcopy(self.pipeline)
+        return cloned
+
+
+# ============================================================================
+# 回放驱动
+# ============================================================================
+
+@dataclass
+class CallStats:
+    name: str
+    node: str
+    samples_ms: list[float] = field(default_factory=list)
+
+    def summary(self) -> str:
+        ordered = sorted(self.samples_ms)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (
+            f"{self.name:<24} [{self.node}] n={len(ordered)} "
+            f"mean={statistics.fmean(ordered):.3f}ms p50={statistics.median(ordered):.3f}ms "
+            f"p95={p95:.3f}ms max={ordered[-1]:.3f}ms"
+        )
+
+
+class ReplayHarness:
+    """加载录制目录，按顺序回放 calls 并统计每次调用耗时"""
+
+    def __init__(self, recording_dir: Path) -> None:
+        self.recording_dir = Path(recording_dir)
+        with open(self.recording_dir / "replay.json", "r", encoding="utf-8") as f:
+            self.recording: dict[str, Any] = json.load(f)
+
+        self.frames: dict[str, numpy.ndarray] = {}
+        for frame_name, source in self.recording.get("frames", {}).items():
+            if isinstance(source, dict):
+                self.frames[frame_name] = build_frame(source)
+            else:
+                self.frames[frame_name] = numpy.load(self.recording_dir / source)
+
+        self.session = ReplaySession(recognitions=self.recording.get("recognitions", {}))
+        self.context = ReplayContext(self.session)
+        self.context.pipeline = load_pipeline(PIPELINE_DIR)
+        self.stats: dict[tuple[str, str], CallStats] = {}
+        self._last_reco: Optional[CustomRecognition.AnalyzeResult] = None
+
+    @staticmethod
+    def load_agent() -> None:
+        """导入 agent/main.py，触发所有 @AgentServer.custom_* 注册"""
+        import main  # noqa: F401
+
+    def get_frame(self, frame_name: str) -> numpy.ndarray:
+        if frame_name not in self.frames:
+            self.frames[frame_name] = numpy.zeros(DEFAULT_FRAME_SHAPE, dtype=numpy.uint8)
+        return self.frames[frame_name]
+
+    def apply_setup(self) -> None:
+        """按 "模块名.属性路径": 值 改写 manager 状态，例如 "battle.battle_manager.get_state.is_configured": true"""
+        import importlib
+
+        for path, value in self.recording.get("setup", {}).items():
+            parts = path.split(".")
+            # 找到最长的可导入模块前缀，剩余部分是属性路径
+            for split in range(len(parts) - 1, 0, -1):
+                try:
+                    target = importlib.import_module(".".join(parts[:split]))
+                except ModuleNotFoundError:
+                    continue
+                for attr in parts[split:-1]:
+                    target = getattr(target, attr)
+                    # manager 状态按会话存放，通过 get_ 函数取出
+                    if attr.startswith("get_") and callable(target):
+                        target = target()
+                setattr(target, parts[-1], value)
+                break
+            else:
+                raise ValueError(f"无法解析 setup 路径: {path}")
+
+    def run_call(self, call: dict[str, Any]) -> Any:
+        kind = call["kind"]
+        name = call["name"]
+        node = call.get("node", name)
+        param = call.get("param", {})
+        param_str = param if isinstance(param, str) else json.dumps(param, ensure_ascii=False)
+        frame_name = call.get("frame", "")
+        if frame_name != self.session.frame_name:
+            # 录制结果按截图名区分，没有截图文件的画面都是全黑图，
+            # OCR 缓存按像素命中会把上一个画面的结果带过来，换画面时清空
+            from utils import ocr_cache
+
+            ocr_cache.invalidate()
+        self.session.frame_name = frame_name
+        image = self.get_frame(self.session.frame_name)
+
+        if kind == "recognition":
+            instance = AgentServer._custom_recognition_holder[name]
+            argv = CustomRecognition.AnalyzeArg(
+                task_detail=None,
+                node_name=node,
+                custom_recognition_name=name,
+                custom_recognition_param=param_str,
+                image=image,
+                roi=Rect(0, 0, image.shape[1], image.shape[0]),
+            )
+            start = time.perf_counter()
+            result = instance.analyze(self.context, argv)
+            elapsed = time.perf_counter() - start
+            self._last_reco = result
+
+        elif kind == "action":
+            instance = AgentServer._custom_action_holder[name]
+            argv = CustomAction.RunArg(
+                task_detail=None,
+                node_name=node,
+                custom_action_name=name,
+                custom_action_param=param_str,
+                reco_detail=self._last_reco_detail(node),
+                box=_to_rect(getattr(self._last_reco, "box", None)) or Rect(),
+            )
+            start = time.perf_counter()
+            result = instance.run(self.context, argv)
+            elapsed = time.perf_counter() - start
+
+        else:
+            raise ValueError(f"未知的调用类型: {kind}")
+
+        key = (name, node)
+        if key not in self.stats:
+            self.stats[key] = CallStats(name=name, node=node)
+        self.stats[key].samples_ms.append(elapsed * 1000)
+        return result
+
+    def _last_reco_detail(self, node: str) -> RecognitionDetail:
+        last = self._last_reco
+        if not isinstance(last, CustomRecognition.AnalyzeResult) or last.box is None:
+            return build_recognition_detail(node, {"hit": False})
+        return build_recognition_detail(
+            node,
+            {"hit": True, "box": last.box, "results": [{"box": last.box, "detail": last.detail}]},
+        )
+
+    def run(self, repeat: int = 1, verbose: bool = False) -> None:
+        self.apply_setup()
+        for round_index in range(repeat):
+            for call in self.recording.get("calls", []):
+                self.session.clear_records()
+                result = self.run_call(call)
+                if verbose and round_index == 0:
+                    print(f"-> {call['kind']} {call['name']} [{call.get('node', '')}]")
+                    print(f"   结果: {result}")
+                    print(f"   子识别: {self.session.recognition_calls}")
+                    print(f"   覆盖: {json.dumps(self.session.overrides, ensure_ascii=False)}")
+                    print(f"   点击: {self.session.clicks}")
+
+    def report(self) -> str:
+        lines = ["=== 回放耗时统计 ==="]
+        lines.extend(stats.summary() for stats in self.stats.values())
+        if self.session.missing:
+            lines.append(f"[WARN] 以下识别没有录制结果，按未命中处理: {sorted(self.session.missing)}")
+        return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="离线回放 agent 自定义识别/动作并统计耗时")
+    parser.add_argument("recording", type=Path, help="录制目录（包含 replay.json）")
+    parser.add_argument("--repeat", type=int, default=1, help="整段回放的重复次数，用于测量耗时")
+    parser.add_argument("--verbose", action="store_true", help="打印第一轮每次调用的覆盖和点击记录")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    ReplayHarness.load_agent()
+    # agent 模块在导入时可能调用 logging.basicConfig，这里重新设置级别
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    harness = ReplayHarness(args.recording)
+    harness.run(repeat=args.repeat, verbose=args.verbose)
+    print(harness.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+manager 计数器并发压力测试
+
+用线程池同时修改各 manager 中会被自定义节点改动的计数器，检查结果是否与串行执行一致：
+  - incr: SinglePotion.usage、EncounterContext.battle_count、BossStats.current_battles、ArenaStats.win_count
+  - compare_and_set: 自旋加一，总数不能多也不能少；forced_release 每轮只能有一个线程设置成功
+  - record_use 与 snapshot: 读线程看到的 usage + stock 必须始终等于初始库存
+同时给出不加锁直接 += 时丢失的次数作为对照(丢不丢取决于线程切换时机，只作参考)。
+
+用法示例：
+  python my_tools/stress_counters.py
+  python my_tools/stress_counters.py --threads 16 --iterations 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "agent"
+if str(AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENT_DIR))
+
+from arena.arena_helper import ArenaStats  # noqa: E402
+from battle.battle_manager import EncounterContext  # noqa: E402
+from boss.boss_manager import BossStats  # noqa: E402
+from recover.recover_manager import SinglePotion  # noqa: E402
+
+
+def hammer(threads: int, work) -> float:
+    """threads 个线程同时执行 work(index)，返回耗时(秒)"""
+    start_gate = threading.Barrier(threads)
+
+    def run(index):
+        start_gate.wait()
+        work(index)
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(run, i) for i in range(threads)]:
+            future.result()
+    return time.perf_counter() - begin
+
+
+def check_incr(threads: int, iterations: int) -> list[str]:
+    targets = [
+        (SinglePotion(), "usage"),
+        (EncounterContext(), "battle_count"),
+        (BossStats(), "current_battles"),
+        (ArenaStats(), "win_count"),
+    ]
+
+    def work(_):
+        for _ in range(iterations):
+            for obj, name in targets:
+                obj.incr(name)
+
+    elapsed = hammer(threads, work)
+    expected = threads * iterations
+    errors = [
+        f"incr {type(obj).__name__}.{name}: {getattr(obj, name)} != {expected}"
+        for obj, name in targets
+        if getattr(obj, name) != expected
+    ]
+    ops = expected * len(targets)
+    print(f"incr             {ops} 次, {elapsed:.2f}s, {ops / elapsed / 1e6:.2f} M次/秒")
+    return errors
+
+
+def check_cas(threads: int, iterations: int) -> list[str]:
+    stats = BossStats()
+    retries = [0] * threads
+
+    def work(index):
+        for _ in range(iterations):
+            while True:
+                current = stats.current_battles
+                if stats.compare_and_set("current_battles", current, current + 1):
+                    break
+                retries[index] += 1
+
+    elapsed = hammer(threads, work)
+    expected = threads * iterations
+    print(f"compare_and_set  {expected} 次, {elapsed:.2f}s, 冲突重试 {sum(retries)} 次")
+    if stats.current_battles != expected:
+        return [f"compare_and_set: {stats.current_battles} != {expected}"]
+    return []
+
+
+def check_single_winner(threads: int, rounds: int) -> list[str]:
+    errors = []
+    for round_index in range(rounds):
+        encounter = EncounterContext()
+        winners = []
+
+        def work(index):
+            if encounter.compare_and_set("forced_release", False, True):
+                winners.append(index)
+
+        hammer(threads, work)
+        if len(winners) != 1:
+            errors.append(f"forced_release 第 {round_index} 轮有 {len(winners)} 个线程设置成功")
+    print(f"单一设置者       {rounds} 轮")
+    return errors
+
+
+def check_snapshot(threads: int, iterations: int) -> list[str]:
+    initial = threads * iterations
+    potion = SinglePotion(name="测试药", stock=initial)
+    torn = []
+    done = threading.Event()
+
+    def work(index):
+        if index % 2 == 0:
+            for _ in range(iterations * 2):
+                potion.record_use()
+        else:
+            while not done.is_set():
+                current = potion.snapshot("usage", "stock")
+                if current["usage"] + current["stock"] != initial:
+                    torn.append(current)
+
+    writers = (threads + 1) // 2
+
+    def supervised(index):
+        try:
+            work(index)
+        finally:
+            if index % 2 == 0 and potion.usage >= writers * iterations * 2:
+                done.set()
+
+    elapsed = hammer(threads, supervised)
+    print(f"record_use/快照  写 {writers * iterations * 2} 次, {elapsed:.2f}s, 不一致快照 {len(torn)} 个")
+    errors = []
+    if torn:
+        errors.append(f"snapshot 读到不一致的 usage/stock，例如 {torn[0]}")
+    if potion.usage != writers * iterations * 2:
+        errors.append(f"record_use: usage {potion.usage} != {writers * iterations * 2}")
+    return errors
+
+
+def baseline_lost_updates(threads: int, iterations: int) -> int:
+    """不加锁直接 += 的对照组，返回丢失的更新次数"""
+    stats = BossStats()
+
+    def work(_):
+        for _ in range(iterations):
+            stats.current_battles += 1
+
+    hammer(threads, work)
+    return threads * iterations - stats.current_battles
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="manager 计数器并发压力测试")
+    parser.add_argument("--threads", type=int, default=8, help="线程数")
+    parser.add_argument("--iterations", type=int, default=5000, help="每个线程的操作次数")
+    parser.add_argument("--rounds", type=int, default=200, help="单一设置者测试的轮数")
+    parser.add_argument("--switch-interval", type=float, default=1e-6, help="线程切换间隔(秒)，越小越容易暴露竞争")
+    args = parser.parse_args()
+
+    sys.setswitchinterval(args.switch_interval)
+    print(f"=== 计数器压力测试 ({args.threads} 线程 x {args.iterations} 次) ===")
+    errors = []
+    errors += check_incr(args.threads, args.iterations)
+    errors += check_cas(args.threads, args.iterations)
+    errors += check_single_winner(args.threads, args.rounds)
+    errors += check_snapshot(args.threads, args.iterations)
+    lost = baseline_lost_updates(args.threads, args.iterations)
+    print(f"对照: 不加锁 += 丢失 {lost} 次更新")
+
+    if errors:
+        print("\n".join(f"失败: {error}" for error in errors))
+        return 1
+    print("全部通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())